@@ -5,7 +5,7 @@ CONSOLE_SCRIPTS = [
     # "gasi-vrp-exp = gasi_vrp_experiments.gasi_vrp_experiments:main"
 ]
 
-INSTALL_REQUIRES = ['matplotlib']
+INSTALL_REQUIRES = ['matplotlib', 'numpy']
 
 setuptools.setup(
     name = "gasi_vrp",
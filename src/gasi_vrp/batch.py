@@ -0,0 +1,64 @@
+import glob
+import os
+from typing import Iterator, List, Optional
+
+import numpy as np
+
+from game import GameFactory
+from vrp import DENSE, GREEDY, load_instance
+from gasi_vrp import ga_social_interaction_vrp, solution_record
+from workers import run_processes, worker_pool
+
+GLOB_CHARACTERS = '*?['
+
+def is_batch_input(source: str) -> bool:
+    """ returns True if source names many instances: a glob, a directory of xml files or a manifest file,
+    rather than an xml file or a compiled instance directory"""
+    if any(c in source for c in GLOB_CHARACTERS):
+        return True
+    if os.path.isdir(source):
+        return not os.path.exists(os.path.join(source, 'meta.json'))
+    return os.path.isfile(source) and not source.endswith('.xml')
+
+def expand_inputs(source: str) -> List[str]:
+    """ returns the instance paths of a glob, of a directory (its xml files) or of a manifest file
+    (one path per line, relative to the manifest, blank lines and lines starting with # are skipped)"""
+    if any(c in source for c in GLOB_CHARACTERS):
+        return sorted(glob.glob(source))
+    if os.path.isdir(source):
+        return sorted(glob.glob(os.path.join(source, '*.xml')))
+
+    base = os.path.dirname(source)
+    with open(source) as manifest:
+        lines = [line.strip() for line in manifest]
+    return [os.path.join(base, line) for line in lines if line and not line.startswith('#')]
+
+_game = None
+_ga_params = {}
+_load_params = {}
+
+def _init_worker(game_code: str, ga_params: dict, load_params: dict):
+    global _game, _ga_params, _load_params
+    _game = GameFactory.create_game(game_code)
+    _ga_params = ga_params
+    _load_params = load_params
+
+def _solve(input_path: str) -> dict:
+    try:
+        vrp = load_instance(os.path.abspath(input_path), **_load_params)
+        cost, routes, _, run = ga_social_interaction_vrp(vrp, _game, **_ga_params)
+        return solution_record(input_path, cost, routes, run)
+    except Exception as e:
+        return {'input': input_path, 'error': f'{type(e).__name__}: {e}'}
+
+def solve_batch(inputs: List[str], game_code: str, ga_params: dict, processes: Optional[int] = None
+        , instance_cache: Optional[str] = None, dtype=np.float64, storage=DENSE, split=GREEDY) -> Iterator[dict]:
+    """ solves every instance of inputs with a pool of processes workers, yields the solution record of
+    every instance as soon as it is solved (so not in the order of inputs), or a record with its error
+
+    ga_params holds the keyword arguments of ga_social_interaction_vrp, see run_processes for the number of workers"""
+    processes = min(run_processes(processes, ga_params), len(inputs))
+    init_args = (game_code, ga_params, dict(cache_dir=instance_cache, dtype=dtype, storage=storage, split=split))
+
+    with worker_pool(processes, _init_worker, init_args) as run:
+        yield from run(_solve, inputs, ordered=False)
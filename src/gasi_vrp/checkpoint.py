@@ -0,0 +1,142 @@
+import json
+import os
+import random
+import tempfile
+import time
+from time import perf_counter
+from typing import List, Optional
+
+import numpy as np
+
+from population import Population
+from vrp import VRP
+from stopping import StopCondition
+from scheduler import OperatorScheduler
+
+CHECKPOINT_VERSION = 2
+
+def _routes_arrays(population: Population):
+    # (route start positions, route costs) of every member flattened, -1 routes for members whose routes are unknown
+    counts = np.array([len(r[0]) if r is not None else -1 for r in population.routes], dtype=np.int32)
+    known = [r for r in population.routes if r is not None]
+    starts = np.array([s for r in known for s in r[0]], dtype=np.int32)
+    costs = np.array([c for r in known for c in r[1]], dtype=np.float64)
+    return counts, starts, costs
+
+def _routes_list(counts: np.ndarray, starts: np.ndarray, costs: np.ndarray):
+    routes, i = [], 0
+    for count in counts.tolist():
+        if count < 0:
+            routes.append(None)
+        else:
+            routes.append((starts[i:i+count].tolist(), costs[i:i+count].tolist()))
+            i += count
+    return routes
+
+class Checkpointer:
+    """ writes the state of a run to path at the end of a generation, at most every interval seconds and
+    always after the last generation, so an interrupted run can be resumed exactly where it stopped
+
+    the state is the populations (chromosomes, strategies, fitness parts and known routes), the generation,
+    the state of the random module and of the NumPy generator, the counters of the stop condition and the state
+    of the operator schedulers (if any), stored as an uncompressed .npz file that replaces the previous one atomically
+
+    with vrp, the population size, the chromosome length and the fingerprint of the instance are stored as well,
+    and restore refuses a checkpoint written for another instance or population size"""
+
+    def __init__(self, path: str, interval: float = 10.0, vrp: Optional[VRP] = None, population_size: Optional[int] = None):
+        self.path = path
+        self.interval = interval
+        # what the checkpoint must match to be resumed by this run
+        self.run = {'population size': population_size, 'chromosome length': vrp.location_count() - 1
+            , 'instance': vrp.fingerprint()} if vrp is not None else None
+        self.generation = 0
+        self.writes = 0
+        self.schedulers: Optional[List[dict]] = None   # states of the schedulers of a restored run
+        self._last_write = perf_counter()
+
+    def end_generation(self, populations: List[Population], rng: Optional[np.random.Generator], stop: StopCondition
+            , generations: int = 1, last: bool = False, schedulers: Optional[List[OperatorScheduler]] = None):
+        self.generation += generations
+        if last or perf_counter() - self._last_write >= self.interval:
+            self.save(populations, rng, stop, schedulers)
+
+    def save(self, populations: List[Population], rng: Optional[np.random.Generator], stop: StopCondition
+            , schedulers: Optional[List[OperatorScheduler]] = None):
+        meta = {
+            'version': CHECKPOINT_VERSION,
+            'generation': self.generation,
+            'islands': len(populations),
+            'run': self.run,
+            'random': random.getstate(),
+            'rng': rng.bit_generator.state if rng is not None else None,
+            'stop': {'generations': stop.generations, 'evaluations': stop.evaluations, 'best cost': stop.best_cost
+                , 'stagnant': stop.stagnant, 'seconds': stop.elapsed()},
+            'schedulers': [scheduler.state() for scheduler in schedulers] if schedulers is not None else None
+        }
+        arrays = {'meta': np.array(json.dumps(meta))}
+        for i, population in enumerate(populations):
+            arrays[f'{i}/main_chromosomes'] = population.main_chromosomes
+            arrays[f'{i}/strategy_chromosomes'] = population.strategy_chromosomes
+            arrays[f'{i}/solution_fitness'] = population.solution_fitness
+            arrays[f'{i}/social_fitness'] = population.social_fitness
+            arrays[f'{i}/total_fitness'] = population.total_fitness
+            arrays[f'{i}/route_counts'], arrays[f'{i}/route_starts'], arrays[f'{i}/route_costs'] = _routes_arrays(population)
+
+        # written next to the checkpoint and renamed over it, so a crash never leaves a partial checkpoint
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.checkpoint-', suffix='.npz')
+        try:
+            with os.fdopen(fd, 'wb') as outfile:
+                np.savez(outfile, **arrays)
+                outfile.flush()
+                os.fsync(outfile.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+        self.writes += 1
+        self._last_write = perf_counter()
+
+    def restore(self, rng: Optional[np.random.Generator], stop: StopCondition) -> Optional[List[Population]]:
+        """ returns the populations of the checkpoint and restores the generation, the random states and
+        the counters of stop (and sets schedulers to the saved scheduler states), or returns None if there is
+        no checkpoint yet"""
+        if not os.path.exists(self.path):
+            return None
+
+        with np.load(self.path) as arrays:
+            meta = json.loads(str(arrays['meta']))
+            if meta['version'] != CHECKPOINT_VERSION:
+                raise ValueError(f"Checkpoint {self.path} has version {meta['version']}, expected {CHECKPOINT_VERSION}")
+            if self.run is not None and meta['run'] is not None:
+                if meta['run']['instance'] != self.run['instance']:
+                    raise ValueError(f"Checkpoint {self.path} was written for another instance")
+                for key in ('population size', 'chromosome length'):
+                    if meta['run'][key] != self.run[key]:
+                        raise ValueError(f"Checkpoint {self.path} has {key} {meta['run'][key]}, not {self.run[key]}")
+
+            populations = []
+            for i in range(meta['islands']):
+                population = Population(arrays[f'{i}/main_chromosomes'], arrays[f'{i}/strategy_chromosomes'])
+                population.solution_fitness[:] = arrays[f'{i}/solution_fitness']
+                population.social_fitness[:] = arrays[f'{i}/social_fitness']
+                population.total_fitness[:] = arrays[f'{i}/total_fitness']
+                for j, routes in enumerate(_routes_list(arrays[f'{i}/route_counts'], arrays[f'{i}/route_starts'], arrays[f'{i}/route_costs'])):
+                    population.routes[j] = routes
+                populations.append(population)
+
+        self.generation = meta['generation']
+        self.schedulers = meta.get('schedulers')
+        version, state, gauss_next = meta['random']
+        random.setstate((version, tuple(state), gauss_next))
+        if rng is not None and meta['rng'] is not None:
+            rng.bit_generator.state = meta['rng']
+
+        stop.generations = meta['stop']['generations']
+        stop.evaluations = meta['stop']['evaluations']
+        stop.best_cost = meta['stop']['best cost']
+        stop.stagnant = meta['stop']['stagnant']
+        stop.started = time.time() - meta['stop']['seconds']
+        return populations
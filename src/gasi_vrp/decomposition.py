@@ -0,0 +1,214 @@
+import math
+import random
+import time
+from time import perf_counter
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from vrp import VRP, DENSE
+from game import Game
+from location import Location
+from gasi_vrp import ga_social_interaction_vrp
+from local_search import EPSILON
+from stopping import StopCondition
+from workers import run_processes, worker_pool
+
+# ways of partitioning the customers of a large instance into clusters solved on their own
+SWEEP = 'sweep'     # sectors of the polar angle around the depot, of about equal demand
+KMEANS = 'kmeans'   # k-means over the coordinates
+
+KMEANS_ITERATIONS = 25
+
+def sweep_clusters(vrp: VRP, clusters: int) -> List[np.ndarray]:
+    """ returns the customer ids of clusters sectors around the depot, each holding about the same demand,
+    the sweep starts at the widest angular gap between customers so no sector straddles it"""
+    customers = _customers(vrp)
+    offset = vrp.coords[customers] - vrp.coords[vrp.depot_id]
+    angles = np.arctan2(offset[:, 1], offset[:, 0])
+    order = np.argsort(angles, kind='stable')
+
+    gaps = np.diff(np.append(angles[order], angles[order[0]] + 2*np.pi))
+    order = np.roll(order, -(int(np.argmax(gaps)) + 1))
+
+    weights = vrp.demand[customers[order]]
+    if weights.sum() <= 0:
+        weights = np.ones(len(order))
+    cumulative = np.cumsum(weights)
+    cuts = np.searchsorted(cumulative, cumulative[-1] * np.arange(1, clusters) / clusters)
+    return [customers[part] for part in np.split(order, cuts) if len(part) > 0]
+
+def kmeans_clusters(vrp: VRP, clusters: int, rng: np.random.Generator, iterations=KMEANS_ITERATIONS) -> List[np.ndarray]:
+    """ returns the customer ids of the clusters of k-means (k-means++ seeding, Lloyd iterations) over the
+    customer coordinates"""
+    customers = _customers(vrp)
+    points = vrp.coords[customers]
+
+    # k-means++: every next center is drawn with probability proportional to the squared distance to the nearest one
+    centers = [points[rng.integers(len(points))]]
+    nearest = ((points - centers[0])**2).sum(axis=1)
+    for _ in range(1, clusters):
+        total = nearest.sum()
+        center = points[rng.choice(len(points), p=nearest / total)] if total > 0 else points[rng.integers(len(points))]
+        centers.append(center)
+        nearest = np.minimum(nearest, ((points - center)**2).sum(axis=1))
+    centers = np.array(centers)
+
+    labels = None
+    for _ in range(iterations):
+        distances = ((points[:, np.newaxis, :] - centers[np.newaxis, :, :])**2).sum(axis=2)
+        new_labels = np.argmin(distances, axis=1)
+        if labels is not None and np.array_equal(labels, new_labels):
+            break
+        labels = new_labels
+
+        counts = np.bincount(labels, minlength=clusters)
+        sums = np.zeros_like(centers)
+        np.add.at(sums, labels, points)
+        filled = counts > 0
+        centers[filled] = sums[filled] / counts[filled, np.newaxis]
+        # an empty cluster restarts at the point farthest from its center
+        for c in np.flatnonzero(~filled):
+            farthest = int(np.argmax(distances[np.arange(len(points)), labels]))
+            centers[c] = points[farthest]
+            labels[farthest] = c
+
+    return [customers[labels == c] for c in range(clusters) if np.any(labels == c)]
+
+def _customers(vrp: VRP) -> np.ndarray:
+    ids = np.arange(vrp.location_count())
+    return ids[ids != vrp.depot_id]
+
+def sub_instance(vrp: VRP, customers: np.ndarray) -> Tuple[VRP, np.ndarray]:
+    """ returns the instance of the depot and customers of vrp, and the ids in vrp of its locations
+    (the depot is location 0)"""
+    ids = np.concatenate(([vrp.depot_id], customers)).astype(np.int64)
+    coords = vrp.coords[ids].tolist()
+    demand = vrp.demand[ids].tolist()
+    locs = [Location(i, tuple(c), d, i == 0) for i, (c, d) in enumerate(zip(coords, demand))]
+
+    dtype = vrp.distance.dtype if vrp.distance is not None else np.float64
+    # a dense matrix is sliced rather than computed again
+    distance = vrp.distance[np.ix_(ids, ids)] if vrp.storage == DENSE else None
+    return VRP(vrp.max_vehicle_capacity, locs, dtype=dtype, storage=vrp.storage, distance=distance, split=vrp.split), ids
+
+def route_cost(vrp: VRP, route: List[int]) -> float:
+    """ returns the distance of a route that starts and ends at the depot"""
+    return float(vrp.edge_costs(route[:-1], route[1:]).sum())
+
+_vrp = None
+_game = None
+_ga_params = {}
+
+def _init_worker(vrp: VRP, game: Game, ga_params: dict):
+    global _vrp, _game, _ga_params
+    _vrp = vrp
+    _game = game
+    _ga_params = ga_params
+
+def _solve_cluster(task):
+    customers, deadline = task
+    sub, ids = sub_instance(_vrp, customers)
+    time_limit = max(deadline - time.time(), 0.0) if deadline is not None else None
+    _, routes, _, run = ga_social_interaction_vrp(sub, _game, time_limit=time_limit, **_ga_params)
+    return [ids[route].tolist() for route in routes], run
+
+class _Cluster:
+    """ the routes of one cluster of a decomposed instance"""
+
+    def __init__(self, vrp: VRP, routes: List[List[int]]):
+        self.routes = routes
+        self.cost = sum(route_cost(vrp, route) for route in routes)
+        self.customers = np.array([c for route in routes for c in route[1:-1]], dtype=np.int64)
+        self.centroid = vrp.coords[self.customers].mean(axis=0) if len(self.customers) else vrp.coords[vrp.depot_id]
+
+def solve_decomposed(vrp: VRP, game: Game, clusters: int, method=SWEEP, boundary_passes=0, processes: Optional[int] = None
+        , debug=False, **ga_params) -> Tuple[float, List[List[int]], dict]:
+    """ cluster-first route-second: partitions the customers into clusters (SWEEP or KMEANS) that share the depot,
+    solves each with ga_social_interaction_vrp on a pool of processes workers and merges their routes,
+    returns the cost and routes of the merged solution and a summary of the run
+
+    every boundary pass solves neighbouring clusters (in the order of their angle around the depot) again as
+    one instance and keeps the result if it is cheaper, its routes going to the nearer of the two clusters,
+    so customers near a boundary can move across it; the pairs of a pass are disjoint and alternate between passes
+
+    ga_params holds the keyword arguments of ga_social_interaction_vrp used for every cluster, see run_processes
+    for the number of workers, except for the stop condition of the whole run: the passes end once the merged
+    cost reaches target_cost (within target_gap), and time_limit is one deadline for all of them, shared out
+    evenly between the clustering and the boundary passes and, within one of them, between the clusters solved
+    one after the other"""
+    started = perf_counter()
+    processes = run_processes(processes, ga_params)
+    stop = StopCondition(ga_params.pop('time_limit', None), None, ga_params.pop('target_cost', None)
+        , ga_params.pop('target_gap', 0.0))
+
+    clusters = max(1, min(clusters, vrp.location_count() - 1))
+    if method == SWEEP:
+        parts = sweep_clusters(vrp, clusters)
+    elif method == KMEANS:
+        parts = kmeans_clusters(vrp, clusters, np.random.default_rng(random.getrandbits(64)))
+    else:
+        raise ValueError(f"Unknown decomposition method '{method}'")
+
+    runs = []
+    workers = min(processes, len(parts))
+    def solve_all(run, parts, stages):
+        # the time left is shared out evenly between the stages left, and within this one between the
+        # waves of clusters the workers solve one after the other
+        deadlines = [None] * len(parts)
+        if stop.deadline is not None:
+            now = time.time()
+            stage = max(stop.deadline - now, 0.0) / stages
+            waves = math.ceil(len(parts) / workers)
+            deadlines = [now + stage * (i // workers + 1) / waves for i in range(len(parts))]
+
+        results = list(run(_solve_cluster, list(zip(parts, deadlines))))
+        runs.extend(run for _, run in results)
+        return [_Cluster(vrp, routes) for routes, _ in results]
+
+    improvements = 0
+    with worker_pool(workers, _init_worker, (vrp, game, ga_params), vrp) as run:
+        passes = boundary_passes if len(parts) > 1 else 0
+        solved = solve_all(run, parts, passes + 1)
+        # neighbours are adjacent in the order of the angle of the cluster centroids around the depot
+        offsets = [c.centroid - vrp.coords[vrp.depot_id] for c in solved]
+        solved = [solved[i] for i in np.argsort([np.arctan2(o[1], o[0]) for o in offsets], kind='stable')]
+        if debug:
+            print('Clusters: ', len(solved), 'cost', sum(c.cost for c in solved))
+        stopped = stop.update(sum(c.cost for c in solved), 0)
+
+        for boundary_pass in range(passes if len(solved) > 1 and not stopped else 0):
+            pairs, used = [], set()
+            for i in range(boundary_pass % 2, len(solved), 2):
+                j = (i + 1) % len(solved)
+                if i not in used and j not in used:
+                    pairs.append((i, j))
+                    used.update((i, j))
+
+            merged = solve_all(run, [np.concatenate((solved[i].customers, solved[j].customers)) for i, j in pairs]
+                , passes - boundary_pass)
+            for (i, j), both in zip(pairs, merged):
+                if both.cost >= solved[i].cost + solved[j].cost - EPSILON:
+                    continue
+                improvements += 1
+                centroid_i, centroid_j = solved[i].centroid, solved[j].centroid
+                closer_i = [((vrp.coords[route[1:-1]].mean(axis=0) - centroid_i)**2).sum()
+                    <= ((vrp.coords[route[1:-1]].mean(axis=0) - centroid_j)**2).sum() for route in both.routes]
+                solved[i] = _Cluster(vrp, [route for route, c in zip(both.routes, closer_i) if c])
+                solved[j] = _Cluster(vrp, [route for route, c in zip(both.routes, closer_i) if not c])
+            if debug:
+                print('Boundary pass: ', boundary_pass + 1, 'cost', sum(c.cost for c in solved))
+            if stop.update(sum(c.cost for c in solved), 0):
+                break
+
+    routes = [route for cluster in solved for route in cluster.routes]
+    reasons = [stop.reason] if stop.reason is not None else sorted({run['stop reason'] for run in runs})
+    summary = {
+        'stop reason': ', '.join(reasons),
+        'generations': sum(run['generations'] for run in runs),
+        'evaluations': sum(run['evaluations'] for run in runs),
+        'seconds': round(perf_counter() - started, 3),
+        'clusters': len(solved),
+        'boundary improvements': improvements
+    }
+    return sum(route_cost(vrp, route) for route in routes), routes, summary
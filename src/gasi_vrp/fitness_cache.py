@@ -0,0 +1,49 @@
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+class FitnessCache:
+    """ bounded least-recently-used map from an encoded solution to its total distance"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._costs = OrderedDict()
+
+    def __len__(self):
+        return len(self._costs)
+
+    def __str__(self):
+        return f"SIZE={len(self)}/{self.max_size} | HITS={self.hits} | MISSES={self.misses} | HIT RATE={self.hit_rate():.3f}"
+
+    @staticmethod
+    def key(encoded_routes) -> bytes:
+        # the raw bytes of the permutation are compact, exact and hashable
+        return np.asarray(encoded_routes, dtype=np.int32).tobytes()
+
+    def get(self, key: bytes) -> Optional[float]:
+        cost = self._costs.get(key)
+        if cost is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._costs.move_to_end(key)
+        return cost
+
+    def put(self, key: bytes, cost: float):
+        self._costs[key] = cost
+        self._costs.move_to_end(key)
+        if len(self._costs) > self.max_size:
+            self._costs.popitem(last=False)
+
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+class RouteMemo(FitnessCache):
+    """ memo of the local search: bounded least-recently-used map from the customer sequence of a route to its
+    (distance, load), so a route that the local search decomposes again (see VRP.decompose) is summed only once;
+    the solution costs of the GA are computed in vectorized batches that never look routes up"""
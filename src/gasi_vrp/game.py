@@ -1,4 +1,8 @@
 import random
+from copy import deepcopy
+from typing import Optional, Tuple
+
+import numpy as np
 
 class Game:
     _T, _R, _P, _S = [0, 0, 0, 0]
@@ -9,16 +13,31 @@ class Game:
             [ (self._R, self._R), (self._S, self._T) ],  # Cooperate
             [ (self._T, self._S), (self._P, self._P) ]   # Defect
         ]
+        # the same table as an array indexed [p1 move, p2 move, player]
+        self.payoff_table = np.array(self.payoff_matrix, dtype=np.float64)
 
     def payoffs(self):
-        return deepcopy(self._PAYOFF_MATRIX)
-        
+        return deepcopy(self.payoff_matrix)
+
     def play(self, p1_prob_coop, p2_prob_coop):
         row = 0 if random.random() < p1_prob_coop else 1
         col = 0 if random.random() < p2_prob_coop else 1
 
         return self.payoff_matrix[row][col]
 
+    def play_batch(self, p1_probs_coop: np.ndarray, p2_probs_coop: np.ndarray
+            , rng: Optional[np.random.Generator] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """ plays one game per pair of cooperation probabilities, returns the payoffs of both players as arrays"""
+        rng = rng or np.random.default_rng(random.getrandbits(64))
+        p1_probs_coop = np.asarray(p1_probs_coop, dtype=np.float64)
+        p2_probs_coop = np.asarray(p2_probs_coop, dtype=np.float64)
+
+        rows = (rng.random(p1_probs_coop.shape) >= p1_probs_coop).astype(np.intp)
+        cols = (rng.random(p2_probs_coop.shape) >= p2_probs_coop).astype(np.intp)
+
+        payoffs = self.payoff_table[rows, cols]
+        return payoffs[..., 0], payoffs[..., 1]
+
 class PrisonersDilemmaGame(Game):
     _T, _R, _P, _S = [5, 3, 1, 0]
 
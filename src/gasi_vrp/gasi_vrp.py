@@ -6,58 +6,71 @@ import math
 import random
 import sys
 import os
-from copy import deepcopy
-from typing import Tuple, List
+from time import process_time
+from typing import Callable, Tuple, List, Optional, TextIO
 
-from vrp_data_reader import read_file
-from vrp import VRP
-from game import *
-from utils import random_pairs, cut_points
-
-class Individual:
-    def __init__(self, main_chromosome: List[int], strategy_chromosome: float):
-        self._main_chromosome = main_chromosome
-        self._strategy_chromosome = strategy_chromosome or 0.0
-        self._solution_fitness = 99999999
-        self._social_fitness = 99999999
-        self._total_fitness = 99999999
-
-    def __str__(self):
-        return f"{self.chromosomes()} || {self._solution_fitness} || {self._social_fitness}"
-    
-    def chromosomes(self):
-        return (self._main_chromosome, self._strategy_chromosome)
-
-    def fitness(self):
-        return self._total_fitness
-
-    def update_fitness_parts(self, solution_fitness, social_fitness):
-        self._solution_fitness = solution_fitness
-        self._social_fitness = social_fitness
-
-    def update_total_fitness(self, max_solution_fitness, max_social_fitness, wgt_solution, wgt_social):
-        if wgt_social > 0:
-            self._total_fitness = wgt_solution*(self._solution_fitness/max_solution_fitness) - wgt_social*(self._social_fitness/max_social_fitness)
-        else:
-            self._total_fitness = self._solution_fitness
+import numpy as np
 
+from vrp import VRP, DENSE, TRIANGULAR, SPARSE, GREEDY, OPTIMAL, load_instance
+from game import *
+from fitness_cache import FitnessCache, RouteMemo
+from population import Population, Individual, UNKNOWN_FITNESS
+from local_search import LocalSearch
+from stopping import StopCondition
+from checkpoint import Checkpointer
+from scheduler import OperatorScheduler, INVERSION, GAUSS
+from parallel_eval import ParallelEvaluator, PIPELINE_BATCHES
+from profiler import Profiler, NULL_PROFILER, EVALUATION, GAME_PLAY, SELECTION, CROSSOVER, MUTATION, LOCAL_SEARCH, REPLACEMENT
+from utils import cut_points
 
 ########## GENETIC OPERATORS ##########
 
 def ox_operator(chromosomeA, chromosomeB, cp1, cp2):
-    n =  len(chromosomeA)
-
-    c1_mid = chromosomeA[cp1:cp2]
-    c1_ends = [chromosomeB[i] for i in list(range(cp2, n)) + list(range(cp2)) if chromosomeB[i] not in c1_mid]
-    c1 = c1_ends[n-cp2:] + c1_mid + c1_ends[:n-cp2]
-
-    c2_mid = chromosomeB[cp1:cp2]
-    c2_ends = [chromosomeA[i] for i in list(range(cp2, n)) + list(range(cp2)) if chromosomeA[i] not in c2_mid]
-    c2 = c2_ends[n-cp2:] + c2_mid + c2_ends[:n-cp2]
-    return (c1, c2)
-
-def inversion_operator(chromosome, cp1, cp2):
-    return chromosome[:cp1] + list(reversed(chromosome[cp1:cp2])) + chromosome[cp2:]
+    chromosomeA = np.asarray(chromosomeA)
+    chromosomeB = np.asarray(chromosomeB)
+
+    def child(donor, filler):
+        n = len(donor)
+
+        # bitmap of the location ids in the segment taken from the donor
+        in_mid = np.zeros(max(donor.max(), filler.max()) + 1, dtype=bool)
+        in_mid[donor[cp1:cp2]] = True
+
+        # the filler read from cp2 onwards (wrapping around) fills the positions outside the segment in order
+        rotated = np.roll(filler, -cp2)
+        ends = rotated[~in_mid[rotated]]
+        c = donor.copy()
+        c[(cp2 + np.arange(len(ends))) % n] = ends
+        return c
+
+    return (child(chromosomeA, chromosomeB), child(chromosomeB, chromosomeA))
+
+def ox_batch(chromosomesA: np.ndarray, chromosomesB: np.ndarray, cp1: np.ndarray, cp2: np.ndarray) -> np.ndarray:
+    """ returns the first ox_operator child of every row of chromosomesA with the same row of chromosomesB,
+    cp1 and cp2 hold the cut points of every row"""
+    k, n = chromosomesA.shape
+    rows = np.arange(k)[:, np.newaxis]
+    positions = np.arange(n)
+
+    # bitmap of the location ids in the segment taken from chromosomesA, one row per pair
+    in_mid = np.zeros((k, max(chromosomesA.max(initial=0), chromosomesB.max(initial=0)) + 1), dtype=bool)
+    in_mid[rows, chromosomesA] = (positions >= cp1[:, np.newaxis]) & (positions < cp2[:, np.newaxis])
+
+    # chromosomesB read from cp2 onwards (wrapping around), the ids that are not in the segment
+    # keep their order and fill the positions from cp2 onwards
+    rotated = chromosomesB[rows, (positions + cp2[:, np.newaxis]) % n]
+    keep = ~in_mid[rows, rotated]
+    destination = (cp2[:, np.newaxis] + np.cumsum(keep, axis=1) - 1) % n
+
+    children = chromosomesA.copy()
+    keep_rows, keep_cols = np.nonzero(keep)
+    children[keep_rows, destination[keep_rows, keep_cols]] = rotated[keep_rows, keep_cols]
+    return children
+
+def inversion_operator(chromosome: np.ndarray, cp1, cp2):
+    mutated = chromosome.copy()
+    mutated[cp1:cp2] = chromosome[cp1:cp2][::-1]
+    return mutated
 
 def gauss_operator(chromosome: float):
     return min(1.0, max(0.0, chromosome + random.gauss(mu=0, sigma=0.3)))
@@ -65,135 +78,412 @@ def gauss_operator(chromosome: float):
 
 ########## MAIN GA FUNCTIONS ##########
 
-def random_population(vrp: VRP, game: Game, population_size: int) -> List[Individual]:
-    # get location ids of non-depot locations
-    destination_ids = list(i for i in vrp.locs_dictionary.keys() if i != vrp.depot_id)
-
-    population: List[Individual] = []
-    for _ in range(population_size):
-        # create random order of location ids and select random strategy
-        random.shuffle(destination_ids)
-        main_chromosome = deepcopy(destination_ids)
-        strategy_chromosome = random.random()
-        
-        # add random indivisual to population
-        population.append(Individual(main_chromosome, strategy_chromosome))
-
-    return population
-
-def update_fitness(population: List[Individual], vrp: VRP, game: Game, wgt_solution: float, wgt_social: float):
-
-    max_solution_fitness = -999999
-    max_social_fitness = -999999
-
-    for idv_1, idv_2 in random_pairs(population):
-        main_chromosome_1, strategy_chromosome_1 = idv_1.chromosomes()
-        main_chromosome_2, strategy_chromosome_2 = idv_2.chromosomes()
-        
-        # solution fitness (route costs)
-        solution_fitness_1 = vrp.total_distance(main_chromosome_1)
-        solution_fitness_2 = vrp.total_distance(main_chromosome_2)
-
-        # social interaction fitness (payoffs from games)
-        social_fitness_1, social_fitness_2 = game.play(strategy_chromosome_1, strategy_chromosome_2)
-
-        # set solution and social fitness
-        idv_1.update_fitness_parts(solution_fitness_1, social_fitness_1)
-        idv_2.update_fitness_parts(solution_fitness_2, social_fitness_2)
-
-        # update max solution and social fitness (used for normalization)
-        max_solution_fitness = max(max_solution_fitness, max(solution_fitness_1, solution_fitness_2))
-        max_social_fitness = max(max_social_fitness, max(social_fitness_1, social_fitness_2))
-
-    # update total fitness using weights and max fitness terms
-    for idv in population:
-        idv.update_total_fitness(max_solution_fitness, max_social_fitness, wgt_solution, wgt_social)
-
-
-def tournament_select(population: List[Individual]):
-    participants = random.sample(range(len(population)), 4)
+def random_population(vrp: VRP, game: Game, population_size: int, rng: Optional[np.random.Generator] = None) -> Population:
+    rng = rng or np.random.default_rng(random.getrandbits(64))
 
-    return min([population[i] for i in participants], key=lambda idv: idv.fitness())
-
-def reproduce(parent_1: Individual, parent_2: Individual) -> Tuple[Individual, Individual]:
-    par_mc_1, par_sc_1 = parent_1.chromosomes()
-    par_mc_2, par_sc_2 = parent_2.chromosomes()
-
-    cp = cut_points(par_mc_1, 2)
-    child_mc_1, child_mc_2 = ox_operator(par_mc_1, par_mc_2, *cp)
-    child_sc_1, child_sc_2 = tuple(random.sample([par_sc_1, par_sc_2], 2))
-
-    return ( Individual(child_mc_1, par_sc_1)
-            , Individual(child_mc_2, child_sc_2))
-
-def mutate(child: Individual, mutation_rate) -> Individual:
-    child_mc, child_sc = child.chromosomes()
+    # get location ids of non-depot locations
+    destination_ids = np.array([i for i in vrp.locs_dictionary.keys() if i != vrp.depot_id], dtype=np.int32)
+
+    # create random order of location ids and select random strategy, one row per individual
+    main_chromosomes = rng.permuted(np.tile(destination_ids, (population_size, 1)), axis=1)
+    strategy_chromosomes = rng.random(population_size)
+
+    return Population(main_chromosomes, strategy_chromosomes)
+
+def start_evaluation(population: Population, vrp: VRP, cache: Optional[FitnessCache] = None
+        , evaluator: Optional[ParallelEvaluator] = None) -> Callable[[], np.ndarray]:
+    """ starts evaluating the solutions of population, returns a function that waits for and returns their costs;
+    with an evaluator the uncached solutions are costed by its workers in the meantime"""
+    costs = np.empty(len(population))
+
+    def distances(rows):
+        if evaluator is not None:
+            return evaluator.submit(population.main_chromosomes[rows])
+        computed = vrp.total_distances(population.main_chromosomes[rows])
+        return lambda: computed
+
+    # individuals with a known route decomposition (e.g. improved by the local search) are already costed
+    unknown = []
+    for i, routes in enumerate(population.routes):
+        if routes is not None:
+            costs[i] = sum(routes[1])
+        else:
+            unknown.append(i)
+
+    if not unknown:
+        return lambda: costs
+
+    if cache is None:
+        unknown_costs = distances(unknown)
+        def finish():
+            costs[unknown] = unknown_costs()
+            return costs
+        return finish
+
+    # look up every distinct chromosome once, clones share the cost of their first occurrence
+    keys = [cache.key(mc) for mc in population.main_chromosomes]
+    known_costs = {}
+    missing = []
+    for i, key in enumerate(keys):
+        if population.routes[i] is not None:
+            known_costs[key] = costs[i]
+            cache.put(key, costs[i])
+        elif key not in known_costs:
+            known_costs[key] = cache.get(key)
+            if known_costs[key] is None:
+                missing.append(i)
+
+    # evaluate the cache misses in one batch
+    missing_costs = distances(missing) if missing else (lambda: [])
+    def finish():
+        for i, cost in zip(missing, np.asarray(missing_costs()).tolist()):
+            known_costs[keys[i]] = cost
+            cache.put(keys[i], cost)
+
+        costs[unknown] = [known_costs[keys[i]] for i in unknown]
+        return costs
+    return finish
+
+def normalized(values: np.ndarray) -> np.ndarray:
+    """ returns values divided by their max, or zeros when the max is zero (e.g. every game ended with no payoff)"""
+    max_value = values.max()
+    return values/max_value if max_value != 0 else np.zeros_like(values)
+
+def update_fitness(population: Population, vrp: VRP, game: Game, wgt_solution: float, wgt_social: float
+        , cache: Optional[FitnessCache] = None, rng: Optional[np.random.Generator] = None
+        , profiler: Profiler = NULL_PROFILER, evaluator: Optional[ParallelEvaluator] = None
+        , evaluation: Optional[Callable[[], np.ndarray]] = None):
+    """ updates the fitness parts and total fitness of population, evaluation is an evaluation of the population
+    already started (see start_evaluation)"""
+    if len(population) == 0:
+        return
+    rng = rng or np.random.default_rng(random.getrandbits(64))
+
+    # solution fitness (route costs) of the whole population in one batch, computed by the evaluator's
+    # workers while the games are played
+    if evaluation is None:
+        with profiler.phase(EVALUATION):
+            evaluation = start_evaluation(population, vrp, cache, evaluator)
+
+    # social interaction fitness (payoffs from games between random pairs, all played in one batch)
+    with profiler.phase(GAME_PLAY):
+        order = rng.permutation(len(population))
+        players_1, players_2 = order[0:len(order)-1:2], order[1::2]
+        population.social_fitness[players_1], population.social_fitness[players_2] = game.play_batch(
+            population.strategy_chromosomes[players_1], population.strategy_chromosomes[players_2], rng)
+        # with an odd size the last member plays a random other one (only its own payoff counts)
+        if len(order) % 2:
+            partner = order[rng.integers(len(order) - 1)] if len(order) > 1 else order[-1]
+            population.social_fitness[order[-1]] = game.play_batch(
+                population.strategy_chromosomes[order[-1:]], population.strategy_chromosomes[[partner]], rng)[0][0]
+
+    with profiler.phase(EVALUATION):
+        population.solution_fitness[:] = evaluation()
+
+    # update total fitness using weights and max fitness terms (used for normalization)
+    if wgt_social > 0:
+        population.total_fitness[:] = wgt_solution*normalized(population.solution_fitness) \
+            - wgt_social*normalized(population.social_fitness)
+    else:
+        population.total_fitness[:] = population.solution_fitness
+
+
+def tournament_select_batch(population: Population, count: int, rng: np.random.Generator, size=4) -> np.ndarray:
+    """ count tournaments at once: returns the index of the winner (lowest total fitness) of each tournament
+    between size distinct random members"""
+    n = len(population)
+
+    # Floyd's sampling of size distinct members per tournament, drawing one column at a time
+    participants = np.empty((count, size), dtype=np.intp)
+    for c, j in enumerate(range(n - size, n)):
+        draw = rng.integers(0, j + 1, count)
+        taken = (participants[:, :c] == draw[:, np.newaxis]).any(axis=1)
+        participants[:, c] = np.where(taken, j, draw)
+
+    fittest = np.argmin(population.total_fitness[participants], axis=1)
+    return participants[np.arange(count), fittest]
+
+def breed(population: Population, parents_1: np.ndarray, parents_2: np.ndarray, offspring: Population
+        , crossover_rate, rng: np.random.Generator, parent_costs: Optional[np.ndarray] = None) -> int:
+    """ order crossover for all pairs of parents at once: writes the children of the pairs selected for crossover
+    to the front of offspring and returns their number, and the solution fitness of the better parent of every
+    child to parent_costs if given"""
+    par_mc_1 = population.main_chromosomes[parents_1]
+    par_mc_2 = population.main_chromosomes[parents_2]
+
+    crossed = (rng.random(len(parents_1)) < crossover_rate) & (par_mc_1 != par_mc_2).any(axis=1)
+    par_mc_1, par_mc_2 = par_mc_1[crossed], par_mc_2[crossed]
+    par_sc_1 = population.strategy_chromosomes[parents_1[crossed]]
+    par_sc_2 = population.strategy_chromosomes[parents_2[crossed]]
+    pairs, n = par_mc_1.shape
+
+    # two distinct cut points per pair
+    cp_a = rng.integers(0, n, pairs)
+    cp_b = rng.integers(0, n - 1, pairs)
+    cp_b += cp_b >= cp_a
+    cp1, cp2 = np.minimum(cp_a, cp_b), np.maximum(cp_a, cp_b)
+
+    # the children of a pair are stored next to each other
+    offspring.main_chromosomes[0:2*pairs:2] = ox_batch(par_mc_1, par_mc_2, cp1, cp2)
+    offspring.main_chromosomes[1:2*pairs:2] = ox_batch(par_mc_2, par_mc_1, cp1, cp2)
+    offspring.strategy_chromosomes[0:2*pairs:2] = par_sc_1
+    offspring.strategy_chromosomes[1:2*pairs:2] = np.where(rng.random(pairs) < 0.5, par_sc_1, par_sc_2)
+    offspring.routes[:2*pairs] = [None] * (2*pairs)
+    if parent_costs is not None:
+        parent_costs[0:2*pairs:2] = parent_costs[1:2*pairs:2] = np.minimum(
+            population.solution_fitness[parents_1[crossed]], population.solution_fitness[parents_2[crossed]])
+
+    return 2*pairs
+
+def mutate(population: Population, child: int, mutation_rate, inversion_rate=0.5) -> Optional[str]:
+    """ mutates the individual at index child in place, returns the operator applied (INVERSION or GAUSS)
+    or None"""
+    child_mc, child_sc = population[child].chromosomes()
 
     if random.random() > mutation_rate:
-        return child
+        return None
 
-    if random.random() > 0.5:
-        mutated_child_mc = inversion_operator(child_mc, *cut_points(child_mc, 2))
-        mutated_child_sc = child_sc
+    if random.random() > 1 - inversion_rate:
+        cp = cut_points(child_mc, 2)
+        population.main_chromosomes[child] = inversion_operator(child_mc, *cp)
+        population.routes[child] = None
+        return INVERSION
     else:
-        mutated_child_mc = child_mc
-        mutated_child_sc = gauss_operator(child_sc)
+        population.strategy_chromosomes[child] = gauss_operator(child_sc)
+        return GAUSS
 
-    return Individual(mutated_child_mc, mutated_child_sc)
+def replace(population: Population, offspring: Population, rng: Optional[np.random.Generator] = None) -> Population:
+    """ every offspring replaces a random non-elite member if its total fitness is better"""
+    rng = rng or np.random.default_rng(random.getrandbits(64))
+    if len(offspring) == 0:
+        return population
 
-def replace(population: List[Individual], offspring: List[Individual]):
+    # the elite (best 10% by solution fitness) only needs to be separated from the rest, not sorted
     elite = int(0.1* len(population))
-    population.sort(key=lambda idv: idv._solution_fitness)
+    non_els = np.argpartition(population.solution_fitness, elite)[elite:] if elite > 0 else np.arange(len(population))
+    slots = non_els[rng.integers(0, len(non_els), len(offspring))]
+
+    # offspring aimed at the same member compete in order, so the member ends up as the first best of them
+    # (or stays if it is better), the same as replacing one offspring after the other
+    order = np.lexsort((offspring.total_fitness, slots))
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = slots[order[1:]] != slots[order[:-1]]
+    challengers = order[first]
+    better = offspring.total_fitness[challengers] < population.total_fitness[slots[challengers]]
+
+    population.assign(slots[challengers[better]], offspring, challengers[better])
+    return population
 
-    els = population[:elite]
-    non_els = population[elite:]
+def fittest_solution(population: Population) -> Individual:
+    return population[int(np.argmin(population.solution_fitness))]
 
-    for c in offspring:
-        i = random.choice(range(len(non_els)))
-        if c.fitness() < non_els[i].fitness():
-            non_els[i] = c
+def evolve(population: Population, vrp: VRP, game: Game, num_generations: int
+        , mutation_rate=0.7, crossover_rate=0.7, wgt_solution=0.5, wgt_social=0
+        , cache: Optional[FitnessCache] = None, rng: Optional[np.random.Generator] = None
+        , local_search: Optional[LocalSearch] = None, stop: Optional[StopCondition] = None
+        , profiler: Profiler = NULL_PROFILER, checkpointer: Optional[Checkpointer] = None
+        , evaluator: Optional[ParallelEvaluator] = None, scheduler: Optional[OperatorScheduler] = None
+        , debug=False) -> Population:
+    """ evolves population for num_generations (or until stop), with a scheduler the mutation operators are
+    chosen by it rather than by mutation_rate; stop counts the generations and evaluations"""
+    rng = rng or np.random.default_rng(random.getrandbits(64))
+    stop = stop or StopCondition()
+
+    # members evaluated before (e.g. in a previous epoch or before a checkpoint) are not counted again
+    evaluations = int(np.count_nonzero(population.solution_fitness == UNKNOWN_FITNESS))
+    profiler.count('evaluations', evaluations)
+    stop.count(evaluations)
+
+    # every member takes part in at most one pairing, so the offspring never outnumber the population
+    offspring_buffer = Population.empty(len(population), population.main_chromosomes.shape[1])
+
+    # with a scheduler: the better parent's cost, the operator applied and the CPU time it took, per child
+    parent_costs, applied, seconds = None, [None] * len(population), np.zeros(len(population))
+    if scheduler is not None:
+        parent_costs = np.empty(len(population))
+
+    def mutate_children(lo, hi):
+        if scheduler is None:
+            for c in range(lo, hi):
+                mutate(offspring_buffer, c, mutation_rate)
+            return
+        rate, inversion_rate = scheduler.mutation_rate(), scheduler.inversion_rate()
+        for c in range(lo, hi):
+            started = process_time()
+            applied[c] = mutate(offspring_buffer, c, rate, inversion_rate=inversion_rate)
+            seconds[c] = process_time() - started
 
-    return els + non_els
+    for gen in range(num_generations):
+        update_fitness(population, vrp, game, wgt_solution, wgt_social, cache, rng, profiler, evaluator)
+        offspring_started = process_time()
+
+        with profiler.phase(SELECTION):
+            parents_1 = tournament_select_batch(population, len(population)//2, rng)
+            parents_2 = tournament_select_batch(population, len(population)//2, rng)
+
+        with profiler.phase(CROSSOVER):
+            n_offspring = breed(population, parents_1, parents_2, offspring_buffer, crossover_rate, rng, parent_costs)
+        offspring = offspring_buffer.truncate(n_offspring)
+        evaluation = None
+        if evaluator is not None and local_search is None:
+            # mutate the offspring in batches, each batch is evaluated by the workers while the next one is mutated
+            batch = max(math.ceil(n_offspring / PIPELINE_BATCHES), 1)
+            evaluations_started = []
+            for lo in range(0, n_offspring, batch):
+                with profiler.phase(MUTATION):
+                    mutate_children(lo, min(lo + batch, n_offspring))
+                with profiler.phase(EVALUATION):
+                    evaluations_started.append(start_evaluation(offspring_buffer.window(lo, min(lo + batch, n_offspring))
+                        , vrp, cache, evaluator))
+            evaluation = lambda: np.concatenate([e() for e in evaluations_started]) if evaluations_started else np.zeros(0)
+        else:
+            with profiler.phase(MUTATION):
+                mutate_children(0, n_offspring)
+
+            if local_search is not None:
+                with profiler.phase(LOCAL_SEARCH):
+                    local_search.improve_generation(population, offspring)
+
+        update_fitness(offspring, vrp, game, wgt_solution, wgt_social, cache, rng, profiler, evaluator, evaluation)
+        if scheduler is not None:
+            # the time spent on the offspring besides their mutations (crossover, local search, evaluation) is shared equally
+            shared = max(process_time() - offspring_started - seconds[:n_offspring].sum(), 0.0) / max(n_offspring, 1)
+            scheduler.credit(applied[:n_offspring], np.maximum(parent_costs[:n_offspring] - offspring.solution_fitness, 0.0)
+                , seconds[:n_offspring] + shared)
+            scheduler.end_generation()
+        with profiler.phase(REPLACEMENT):
+            population = replace(population, offspring, rng)
+        profiler.count('evaluations', n_offspring)
+
+        best_cost = float(population.solution_fitness.min())
+        profiler.end_generation(best_cost)
+        stopped = stop.update(best_cost, evaluations=n_offspring)
+        if debug and gen%100 == 0:
+            print('Generation: ', stop.generations, 'evaluations', stop.evaluations, '||', fittest_solution(population))
+        if checkpointer is not None:
+            checkpointer.end_generation([population], rng, stop, last=stopped or gen == num_generations - 1
+                , schedulers=[scheduler] if scheduler is not None else None)
+        if stopped:
+            break
 
-def fittest_solution(population: List[Individual]):
-    return min(population, key=lambda idv: idv._solution_fitness)
+    return population
 
 def ga_social_interaction_vrp(vrp: VRP, game: Game
         , population_size: int, num_generations: int
         , mutation_rate=0.7, crossover_rate=0.7, wgt_solution=0.5, wgt_social=0
-        , debug=False):
-
-    population = random_population(vrp, game, population_size)
+        , cache_size=10000, ls_memo_size=0, islands=1, migration_interval=50, migration_size=1, topology='ring'
+        , ls_rate=0.0, ls_time=None, ls_neighbors=10, ls_elite=False
+        , time_limit=None, stagnation=None, target_cost=None, target_gap=0.0
+        , profiler: Optional[Profiler] = None, checkpoint: Optional[str] = None, checkpoint_interval=10.0, resume=False
+        , eval_workers=0, adaptive=False, operator_log: Optional[TextIO] = None, debug=False):
+    """ returns the cost and routes of the fittest solution, the strategies of the final population and
+    a summary of the run (why it stopped, generations, evaluations and seconds)
+
+    pass a Profiler to time the phases of the generations, e.g. Profiler(callback=print), and a checkpoint
+    path to save the state of the run every checkpoint_interval seconds; with resume a run continues from
+    its checkpoint, if there is one, up to num_generations in total
+
+    with eval_workers, the solutions are evaluated by that many worker processes (not with islands)
+
+    with ls_memo_size, the local search memoizes the costs of the routes it decomposes (see RouteMemo) for the
+    run, unless the instance has a memo already
+
+    with adaptive, an OperatorScheduler per island chooses the mutation operators (mutation_rate only sets their
+    initial probabilities), the final probabilities are added to the summary and the records of the schedulers
+    are written to operator_log as JSON lines"""
+    stop = StopCondition(time_limit, stagnation, target_cost, target_gap)
+    profiler = profiler or NULL_PROFILER
+    checkpointer = Checkpointer(checkpoint, checkpoint_interval, vrp, population_size) if checkpoint else None
+
+    ls_params = dict(rate=ls_rate, time_budget=ls_time, neighbors=ls_neighbors, elite=ls_elite) if ls_rate > 0 or ls_elite else None
+
+    if islands > 1 and eval_workers > 0:
+        raise ValueError("Islands already evolve in worker processes, they cannot use evaluation workers")
+
+    schedulers = [OperatorScheduler(mutation_rate) for _ in range(max(islands, 1))] if adaptive else None
+
+    if islands > 1:
+        from islands import evolve_islands
+        populations = checkpointer.restore(None, stop) if resume and checkpointer else None
+        if populations is not None and len(populations) != islands:
+            raise ValueError(f"Checkpoint {checkpoint} has {len(populations)} islands, not {islands}")
+        done = checkpointer.generation if checkpointer else 0
+        if schedulers is not None and populations is not None and checkpointer.schedulers is not None:
+            for scheduler, state in zip(schedulers, checkpointer.schedulers):
+                scheduler.restore(state)
+
+        population = evolve_islands(vrp, game, population_size, num_generations - done, islands
+            , migration_interval, migration_size, topology
+            , mutation_rate=mutation_rate, crossover_rate=crossover_rate
+            , wgt_solution=wgt_solution, wgt_social=wgt_social, cache_size=cache_size, ls_memo_size=ls_memo_size, ls_params=ls_params, stop=stop, profiler=profiler
+            , populations=populations, checkpointer=checkpointer, schedulers=schedulers, debug=debug)
+    else:
+        rng = np.random.default_rng(random.getrandbits(64))
+        populations = checkpointer.restore(rng, stop) if resume and checkpointer else None
+        if populations is not None and len(populations) != 1:
+            raise ValueError(f"Checkpoint {checkpoint} has {len(populations)} islands, not 1")
+        population = populations[0] if populations is not None else random_population(vrp, game, population_size, rng)
+        done = checkpointer.generation if checkpointer else 0
+        if schedulers is not None and populations is not None and checkpointer.schedulers is not None:
+            schedulers[0].restore(checkpointer.schedulers[0])
+
+        cache = FitnessCache(cache_size) if cache_size > 0 else None
+        local_search = LocalSearch(vrp, **ls_params) if ls_params is not None else None
+        evaluator = ParallelEvaluator(vrp, eval_workers, 2*len(population), population.main_chromosomes.shape[1]) if eval_workers > 0 else None
+        # the memo of the run is taken off the instance again at the end
+        route_memo = RouteMemo(ls_memo_size) if ls_memo_size > 0 and vrp.route_memo is None else None
+        if route_memo is not None:
+            vrp.route_memo = route_memo
+        try:
+            population = evolve(population, vrp, game, num_generations - done
+                , mutation_rate, crossover_rate, wgt_solution, wgt_social, cache, rng, local_search, stop, profiler, checkpointer
+                , evaluator=evaluator, scheduler=schedulers[0] if schedulers is not None else None, debug=debug)
+        finally:
+            if evaluator is not None:
+                evaluator.close()
+            if route_memo is not None:
+                vrp.route_memo = None
+
+        if debug and cache is not None:
+            print('Fitness cache: ', cache)
+        if debug and route_memo is not None:
+            print('Local search memo: ', route_memo)
+        if debug and local_search is not None:
+            print('Local search: ', local_search)
+
+    profiler.emit(stop.best_cost)
+    run = stop.summary()
+    if schedulers is not None:
+        run['operator probabilities'] = [scheduler.operator_probabilities() for scheduler in schedulers]
+        for i, scheduler in enumerate(schedulers):
+            if scheduler.uses.any():
+                scheduler.log()
+            if operator_log is not None:
+                operator_log.writelines(json.dumps({'island': i, **record}) + '\n' for record in scheduler.history)
+            if debug:
+                print('Operators: ', scheduler)
+    if debug:
+        print('Run: ', stop)
+    if debug and checkpointer is not None:
+        print('Checkpoint: ', checkpointer.path, 'generation', checkpointer.generation, 'writes', checkpointer.writes)
 
-    for gen in range(num_generations):
-        update_fitness(population, vrp, game, wgt_solution, wgt_social)
-
-        offspring = []
-        for i in range(population_size//2):
-            p1 = tournament_select(population)
-            p2 = tournament_select(population)
-
-            if random.random() < crossover_rate and p1._main_chromosome != p2._main_chromosome:
-                c1, c2 = reproduce(p1, p2)
-                c1 = mutate(c1, mutation_rate)
-                c2 = mutate(c2, mutation_rate)
-                offspring.append(c1)
-                offspring.append(c2)
-
-        update_fitness(offspring, vrp, game, wgt_solution, wgt_social)
-        population = replace(population, offspring)
-        
-        
-        if debug and gen%100 == 0:
-            print(fittest_solution(population))
-            
     fittest_stn = fittest_solution(population)
+    fittest_mc, _ = fittest_stn.chromosomes()
     return (
-        fittest_stn._solution_fitness,
-        [route for route in vrp.decode_routes(fittest_stn._main_chromosome)], 
-        list(map(lambda x: x._strategy_chromosome, population))
+        fittest_stn.solution_fitness,
+        [route for route in vrp.decode_routes(fittest_mc.tolist())], 
+        population.strategy_chromosomes.tolist(),
+        run
     )
 
+def solution_record(input_path: str, cost: float, routes, run: dict) -> dict:
+    return {
+        'input': input_path,
+        'total distance': cost,
+        'routes': [{f'route {i+1}': [l+1 for l in r]} for i, r in enumerate(routes)],
+        **run
+    }
+
 def parse_args():
     def constrained_float(x):
         try:
@@ -206,7 +496,8 @@ def parse_args():
 
     parser = argparse.ArgumentParser(description='Runs the Genetic Algorithm with Social Interaction (GASI) to solve the vehicle routing problem (VRP)')
 
-    parser.add_argument('input',  help='The file path of the problem instance')
+    parser.add_argument('input',  help='The file path of the problem instance, an xml file or a compiled instance directory; '
+        'or, to solve many instances, a directory of xml files, a quoted glob or a manifest file with one path per line')
     
     parser.add_argument('-p', dest='pop_size', type=int, default=500,
         help='The size of the population (default: %(default)s)')
@@ -227,6 +518,98 @@ def parse_args():
     parser.add_argument('-w', dest='wgt_social', type=constrained_float, default=0.25,
         help='The weight of the social fitness (solution fitness weight is 1 - WGT_SOCIAL)')
 
+    parser.add_argument('--cache-size', dest='cache_size', type=int, default=10000,
+        help='Number of solution costs kept in the fitness cache, 0 disables it (default: %(default)s)')
+
+    parser.add_argument('--ls-memo-size', dest='ls_memo_size', type=int, default=0,
+        help='Number of route costs the local search memoizes, 0 disables the memo (default: %(default)s)')
+
+    parser.add_argument('-j', '--islands', dest='islands', type=int, default=1,
+        help='Number of islands evolved in parallel worker processes, the population is split between them (default: %(default)s)')
+
+    parser.add_argument('--migration-interval', dest='migration_interval', type=int, default=50,
+        help='Number of generations between migrations of the best individuals of the islands (default: %(default)s)')
+
+    parser.add_argument('--migrants', dest='migration_size', type=int, default=1,
+        help='Number of best individuals each island sends per migration (default: %(default)s)')
+
+    parser.add_argument('--topology', dest='topology', type=str, default='ring', choices=['ring', 'all'],
+        help='Islands an island sends its migrants to, the next one or all others (default: %(default)s)')
+
+    parser.add_argument('--eval-workers', dest='eval_workers', type=int, default=0,
+        help='Number of worker processes evaluating the solutions of the single population, 0 evaluates them in this process (default: %(default)s)')
+
+    parser.add_argument('--ls-rate', dest='ls_rate', type=constrained_float, default=0.0,
+        help='Probability that an offspring is improved by local search [0-1] (default: %(default)s)')
+
+    parser.add_argument('--ls-time', dest='ls_time', type=float, default=None,
+        help='Seconds of local search allowed per generation (default: no limit)')
+
+    parser.add_argument('--ls-neighbors', dest='ls_neighbors', type=int, default=10,
+        help='Number of nearest neighbours of a customer the local search moves consider (default: %(default)s)')
+
+    parser.add_argument('--ls-elite', dest='ls_elite', action='store_true',
+        help='Also improve the fittest individual of every generation by local search')
+
+    parser.add_argument('--adaptive', dest='adaptive', action='store_true',
+        help='Adapt the probabilities of the mutation operators during the run to the fitness gain they produce per CPU-second, MUT_RATE only sets where they start')
+
+    parser.add_argument('--operator-log', dest='operator_log', type=str, default=None,
+        help='File the probabilities, rewards and uses of the mutation operators are appended to as JSON lines, with --adaptive')
+
+    parser.add_argument('--time-limit', dest='time_limit', type=float, default=None,
+        help='Stop after this many seconds, at the end of the running generation (default: no limit)')
+
+    parser.add_argument('--stagnation', dest='stagnation', type=int, default=None,
+        help='Stop once the best cost has not improved for this many generations (default: never)')
+
+    parser.add_argument('--target-cost', dest='target_cost', type=float, default=None,
+        help='Stop once the best cost reaches this cost, e.g. the best known solution (default: none)')
+
+    parser.add_argument('--target-gap', dest='target_gap', type=float, default=0.0,
+        help='Relative gap to the target cost that is good enough, e.g. 0.01 for 1%% (default: %(default)s)')
+
+    parser.add_argument('--profile', dest='profile', type=str, default=None,
+        help='File the time spent in every phase of the generations is appended to, as JSON lines')
+
+    parser.add_argument('--profile-interval', dest='profile_interval', type=int, default=100,
+        help='Number of generations covered by each line of the profile (default: %(default)s)')
+
+    parser.add_argument('--checkpoint', dest='checkpoint', type=str, default=None,
+        help='File the state of the run is saved to, so it can be resumed')
+
+    parser.add_argument('--checkpoint-interval', dest='checkpoint_interval', type=float, default=10.0,
+        help='Seconds between checkpoints, the last generation is always saved (default: %(default)s)')
+
+    parser.add_argument('--resume', dest='resume', action='store_true',
+        help='Continue the run saved in the checkpoint file, if it exists, up to NUM_GENS generations in total')
+
+    parser.add_argument('--split', dest='split', type=str, default=GREEDY, choices=[GREEDY, OPTIMAL],
+        help='How a solution is split into vehicle routes, greedily or optimally (default: %(default)s)')
+
+    parser.add_argument('--dist-storage', dest='dist_storage', type=str, default=DENSE,
+        choices=[DENSE, TRIANGULAR, SPARSE],
+        help='Storage of the distance matrix, triangular halves its memory and sparse computes distances from the coordinates instead (default: %(default)s)')
+
+    parser.add_argument('--dist-dtype', dest='dist_dtype', type=str, default='float64',
+        choices=['float64', 'float32'],
+        help='Floating point type of the distance matrix (default: %(default)s)')
+
+    parser.add_argument('--instance-cache', dest='instance_cache', type=str, default=None,
+        help='Directory where xml instances are compiled to a binary form that later runs load directly')
+
+    parser.add_argument('--clusters', dest='clusters', type=int, default=0,
+        help='Partition the customers into this many clusters that are solved separately and merged, for large instances (default: no partition)')
+
+    parser.add_argument('--cluster-method', dest='cluster_method', type=str, default='sweep', choices=['sweep', 'kmeans'],
+        help='How the customers are partitioned, by sectors around the depot or by k-means (default: %(default)s)')
+
+    parser.add_argument('--boundary-passes', dest='boundary_passes', type=int, default=0,
+        help='Number of passes solving neighbouring clusters together again after the merge (default: %(default)s)')
+
+    parser.add_argument('--workers', dest='workers', type=int, default=None,
+        help='Number of worker processes solving the instances of a batch input or the clusters of an instance (default: number of CPUs)')
+
     parser.add_argument('-o', '--output', help='Output file path')
 
     parser.add_argument('-d', '--debug', action="store_true")
@@ -246,38 +629,120 @@ def echo_args(args):
         print('Weight of solution fitness: ', 1-args.wgt_social)
         print('Weight of social fitness: ', args.wgt_social)
         print('Game: ', args.game)
+        print('Fitness cache size: ', args.cache_size)
+        print('Local search memo size: ', args.ls_memo_size)
+        if args.ls_rate > 0 or args.ls_elite:
+            print('Local search: ', args.ls_rate, 'of offspring,', 'elite,' if args.ls_elite else '', args.ls_neighbors, 'neighbors,', args.ls_time, 's per generation')
+        if args.time_limit is not None or args.stagnation is not None or args.target_cost is not None:
+            print('Stop: ', args.time_limit, 's,', args.stagnation, 'stagnant generations,', 'target', args.target_cost, 'gap', args.target_gap)
+        if args.adaptive:
+            print('Adaptive mutation operators, starting from the mutation rate')
+        if args.eval_workers > 0:
+            print('Evaluation workers: ', args.eval_workers)
+        if args.islands > 1:
+            print('Islands: ', args.islands)
+            print('Migration: ', args.migration_size, 'every', args.migration_interval, 'generations,', args.topology, 'topology')
+        if args.clusters > 1:
+            print('Clusters: ', args.clusters, args.cluster_method, args.boundary_passes, 'boundary passes')
+        print('Split: ', args.split)
+        print('Distance matrix: ', args.dist_storage, args.dist_dtype)
         print('-'*30)
 
 def main():
     args = parse_args()
     echo_args(args)
 
-    vrp = VRP(*read_file(os.path.abspath(args.input)))
     game = GameFactory.create_game(args.game)
-
-    cost, routes, dist = ga_social_interaction_vrp(
-        vrp,
-        game,
+    ga_params = dict(
         population_size=args.pop_size,
         num_generations=args.num_gens,
         mutation_rate=args.mut_rate, 
         crossover_rate=args.cro_rate, 
         wgt_solution=1-args.wgt_social, 
         wgt_social=args.wgt_social,
+        cache_size=args.cache_size,
+        ls_memo_size=args.ls_memo_size,
+        islands=args.islands,
+        migration_interval=args.migration_interval,
+        migration_size=args.migration_size,
+        topology=args.topology,
+        eval_workers=args.eval_workers,
+        ls_rate=args.ls_rate,
+        ls_time=args.ls_time,
+        ls_neighbors=args.ls_neighbors,
+        ls_elite=args.ls_elite,
+        time_limit=args.time_limit,
+        stagnation=args.stagnation,
+        target_cost=args.target_cost,
+        target_gap=args.target_gap,
+        adaptive=args.adaptive
+    )
+
+    from batch import is_batch_input
+    if is_batch_input(args.input):
+        solve_all(args, ga_params)
+        return
+
+    vrp = load_instance(os.path.abspath(args.input), args.instance_cache, dtype=args.dist_dtype, storage=args.dist_storage
+        , split=args.split)
+
+    if args.clusters > 1:
+        from decomposition import solve_decomposed
+        if args.profile or args.checkpoint or args.operator_log:
+            raise SystemExit('--profile, --checkpoint and --operator-log cannot be used with --clusters')
+        cost, routes, run = solve_decomposed(vrp, game, args.clusters, args.cluster_method, args.boundary_passes, args.workers
+            , debug=args.debug, **ga_params)
+        write_solution(args, solution_record(os.path.basename(args.input), cost, routes, run))
+        return
+
+    profile = open(args.profile, 'a') if args.profile else None
+    profiler = Profiler(profile, args.profile_interval) if profile else None
+    operator_log = open(args.operator_log, 'a') if args.operator_log else None
+
+    cost, routes, dist, run = ga_social_interaction_vrp(
+        vrp,
+        game,
+        **ga_params,
+        profiler=profiler,
+        checkpoint=args.checkpoint,
+        checkpoint_interval=args.checkpoint_interval,
+        resume=args.resume,
+        operator_log=operator_log,
         debug=args.debug
     )
+    if profile:
+        profile.close()
+    if operator_log:
+        operator_log.close()
 
-    solution = {
-        'input': os.path.basename(args.input),
-        'total distance': cost,
-        'routes': [{f'route {i+1}': [l+1 for l in r]} for i, r in enumerate(routes)]
-    }
+    write_solution(args, solution_record(os.path.basename(args.input), cost, routes, run))
 
+def write_solution(args, solution: dict):
     if args.debug:
         print(json.dumps(solution))
     if args.output:
         with open(args.output, 'w') as outfile:
             json.dump(solution, outfile)
 
+def solve_all(args, ga_params: dict):
+    """ solves the instances of a batch input, writing one JSON line per solved instance to the output
+    (or stdout) as soon as it is solved"""
+    from batch import expand_inputs, solve_batch
+    if args.profile or args.checkpoint or args.operator_log or args.clusters > 1:
+        raise SystemExit('--profile, --checkpoint, --operator-log and --clusters need a single input instance')
+
+    inputs = expand_inputs(args.input)
+    outfile = open(args.output, 'w') if args.output else sys.stdout
+    try:
+        for i, record in enumerate(solve_batch(inputs, args.game, ga_params, args.workers
+                , args.instance_cache, dtype=args.dist_dtype, storage=args.dist_storage, split=args.split)):
+            outfile.write(json.dumps(record) + '\n')
+            outfile.flush()
+            if args.debug and outfile is not sys.stdout:
+                print(f">> {i+1}/{len(inputs)}: {record['input']} = {record.get('total distance', record.get('error'))}")
+    finally:
+        if outfile is not sys.stdout:
+            outfile.close()
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,129 @@
+from typing import List, Optional
+
+import numpy as np
+
+from vrp import VRP
+from game import Game
+from fitness_cache import FitnessCache, RouteMemo
+from population import Population
+from local_search import LocalSearch
+from stopping import StopCondition
+from profiler import Profiler, NULL_PROFILER
+from checkpoint import Checkpointer
+from scheduler import OperatorScheduler
+from gasi_vrp import random_population, evolve, fittest_solution
+from workers import worker_pool
+
+RING = 'ring'       # island i sends its migrants to island i+1
+ALL = 'all'         # every island sends its migrants to all other islands
+
+_vrp = None
+_game = None
+_cache = None
+_local_search = None
+_ga_params = {}
+
+def _init_worker(vrp: VRP, game: Game, cache_size: int, ls_memo_size: int, ls_params: Optional[dict], ga_params: dict):
+    global _vrp, _game, _cache, _local_search, _ga_params
+    _vrp = vrp
+    _vrp.route_memo = RouteMemo(ls_memo_size) if ls_memo_size > 0 else None
+    _game = game
+    _cache = FitnessCache(cache_size) if cache_size > 0 else None
+    _local_search = LocalSearch(vrp, **ls_params) if ls_params is not None else None
+    _ga_params = ga_params
+
+def _evolve_island(task):
+    population, num_generations, stop, profiler, scheduler = task
+
+    if profiler is not None:
+        profiler.reset()
+    population = evolve(population, _vrp, _game, num_generations, cache=_cache, local_search=_local_search
+        , stop=stop, profiler=profiler or NULL_PROFILER, scheduler=scheduler, **_ga_params)
+    if profiler is not None:
+        profiler.count_allocations()
+    return population, stop, profiler, scheduler
+
+def migrate(populations: List[Population], migration_size: int, topology: str):
+    """ replaces the worst individuals of every island with copies of the best individuals of its neighbours"""
+    n = len(populations)
+    bests = [p.take(np.argsort(p.solution_fitness, kind='stable')[:migration_size]) for p in populations]
+
+    for i, population in enumerate(populations):
+        if topology == RING:
+            sources = [(i - 1) % n]
+        elif topology == ALL:
+            sources = [j for j in range(n) if j != i]
+        else:
+            raise ValueError(f"Unknown migration topology '{topology}'")
+
+        worst = np.argsort(population.solution_fitness, kind='stable')[::-1]
+        for k, j in enumerate(sources):
+            population.assign(worst[k*migration_size:(k+1)*migration_size], bests[j], np.arange(len(bests[j])))
+
+def evolve_islands(vrp: VRP, game: Game, population_size: int, num_generations: int, islands: int
+        , migration_interval=50, migration_size=1, topology=RING
+        , mutation_rate=0.7, crossover_rate=0.7, wgt_solution=0.5, wgt_social=0
+        , cache_size=10000, ls_memo_size=0, ls_params: Optional[dict] = None, stop: Optional[StopCondition] = None
+        , profiler: Profiler = NULL_PROFILER, populations: Optional[List[Population]] = None
+        , checkpointer: Optional[Checkpointer] = None, schedulers: Optional[List[OperatorScheduler]] = None
+        , debug=False) -> Population:
+    """ evolves the population split into islands, one process per island, and returns the union of the islands
+
+    the islands stop an epoch early on the deadline or target of stop, stagnation is checked between epochs,
+    the profiles of the islands are added up and the checkpoint is written once per epoch; populations
+    (e.g. restored from a checkpoint) replace the random initial islands
+
+    with schedulers (one per island), every island chooses its mutation operators by its own scheduler,
+    which travels with the island between epochs, the list is updated in place"""
+    stop = stop or StopCondition()
+    # individuals are paired up for the games, so every island gets an even share
+    island_size = 2 * (population_size // (2 * islands))
+    if island_size < 4:
+        raise ValueError(f"A population of {population_size} is too small for {islands} islands")
+    if migration_size * (islands - 1 if topology == ALL else 1) >= island_size:
+        raise ValueError(f"Islands of {island_size} individuals cannot take {migration_size} migrants from each neighbour")
+
+    populations_resumed = populations is not None
+    if populations is None:
+        populations = [random_population(vrp, game, island_size) for _ in range(islands)]
+    ga_params = dict(mutation_rate=mutation_rate, crossover_rate=crossover_rate
+        , wgt_solution=wgt_solution, wgt_social=wgt_social)
+
+    # the workers attach to the shared instance instead of receiving a copy each
+    with worker_pool(islands, _init_worker, (vrp, game, cache_size, ls_memo_size, ls_params, ga_params), vrp) as run:
+        gen = 0
+        # migrants move between epochs, i.e. before every epoch but the first of a new run
+        while gen < num_generations:
+            if gen > 0 or populations_resumed:
+                migrate(populations, migration_size, topology)
+
+            epoch = min(migration_interval, num_generations - gen)
+            # the profiles of the islands only collect, the profiler of the run emits
+            tasks = [(population, epoch, stop.epoch(), Profiler(interval=None) if profiler is not NULL_PROFILER else None
+                , schedulers[i] if schedulers is not None else None) for i, population in enumerate(populations)]
+            populations, epoch_stops, epoch_profilers, epoch_schedulers = zip(*run(_evolve_island, tasks))
+            populations = list(populations)
+            if schedulers is not None:
+                schedulers[:] = epoch_schedulers
+
+            # the islands run side by side, so the epoch took as many generations as the longest island
+            epoch = max(s.generations for s in epoch_stops)
+            gen += epoch
+
+            if debug:
+                print(f"Generation {gen}: ", ' | '.join(str(fittest_solution(p).solution_fitness) for p in populations))
+
+            best_cost = min(float(p.solution_fitness.min()) for p in populations)
+            for epoch_profiler in epoch_profilers:
+                if epoch_profiler is not None:
+                    profiler.add(epoch_profiler)
+            profiler.end_generation(best_cost, epoch)
+            stopped = stop.update(best_cost, epoch, sum(s.evaluations for s in epoch_stops))
+
+            # the workers are seeded from the random state of this process, so it is all that needs saving
+            if checkpointer is not None:
+                checkpointer.end_generation(populations, None, stop, epoch, last=stopped or gen >= num_generations, schedulers=schedulers)
+            if stopped:
+                break
+
+    return Population.concatenate(populations)
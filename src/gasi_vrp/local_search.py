@@ -0,0 +1,203 @@
+import random
+from collections import deque
+from time import perf_counter
+from typing import List, Optional
+
+import numpy as np
+
+from vrp import VRP
+from population import Population
+
+EPSILON = 1e-9  # smallest decrease in distance that counts as an improvement
+
+def improve_routes(vrp: VRP, routes: List[List[int]], neighbors: List[List[int]], deadline: Optional[float] = None) -> List[List[int]]:
+    """ first-improvement local search over relocate, swap, 2-opt and or-opt moves between each customer and
+    its nearest neighbours, returns the improved routes (lists of customers without the depot)
+
+    a customer is only looked at again (its don't-look bit cleared) once a move changes one of its edges
+    """
+    depot = vrp.depot_id
+    capacity = vrp.max_vehicle_capacity
+    demand = vrp.demand.tolist()
+    d = vrp.edge_cost
+
+    routes = [list(route) for route in routes]
+    loads = [sum(demand[c] for c in route) for route in routes]
+    route_of = [-1] * vrp.location_count()
+    pos_of = [-1] * vrp.location_count()
+
+    def index_route(r):
+        for i, c in enumerate(routes[r]):
+            route_of[c] = r
+            pos_of[c] = i
+
+    def prev(c):
+        i = pos_of[c]
+        return routes[route_of[c]][i-1] if i > 0 else depot
+
+    def next_(c):
+        route = routes[route_of[c]]
+        i = pos_of[c]
+        return route[i+1] if i + 1 < len(route) else depot
+
+    def move_segment(segment, v, before):
+        # moves the consecutive customers in segment next to v
+        ru = route_of[segment[0]]
+        iu = pos_of[segment[0]]
+        del routes[ru][iu:iu+len(segment)]
+        loads[ru] -= sum(demand[c] for c in segment)
+        index_route(ru)
+
+        rv = route_of[v]
+        iv = pos_of[v] if before else pos_of[v] + 1
+        routes[rv][iv:iv] = segment
+        loads[rv] += sum(demand[c] for c in segment)
+        index_route(rv)
+
+    def try_moves(u):
+        ru = route_of[u]
+        pu, nu = prev(u), next_(u)
+
+        for v in neighbors[u]:
+            if v == depot or route_of[v] < 0:
+                continue
+            rv = route_of[v]
+            pv, nv = prev(v), next_(v)
+            same_route = ru == rv
+            fits = same_route or loads[rv] + demand[u] <= capacity
+
+            # relocate u after v
+            if fits and v != pu:
+                delta = d(pu, nu) - d(pu, u) - d(u, nu) + d(v, u) + d(u, nv) - d(v, nv)
+                if delta < -EPSILON:
+                    move_segment([u], v, before=False)
+                    return [u, v, pu, nu, nv]
+
+            # relocate u before v
+            if fits and v != nu and pv != u:
+                delta = d(pu, nu) - d(pu, u) - d(u, nu) + d(pv, u) + d(u, v) - d(pv, v)
+                if delta < -EPSILON:
+                    move_segment([u], v, before=True)
+                    return [u, v, pu, nu, pv]
+
+            # swap u and v
+            if (not same_route and loads[ru] - demand[u] + demand[v] <= capacity and loads[rv] - demand[v] + demand[u] <= capacity) \
+                    or (same_route and v != pu and v != nu):
+                delta = d(pu, v) + d(v, nu) - d(pu, u) - d(u, nu) + d(pv, u) + d(u, nv) - d(pv, v) - d(v, nv)
+                if delta < -EPSILON:
+                    routes[ru][pos_of[u]], routes[rv][pos_of[v]] = v, u
+                    loads[ru] += demand[v] - demand[u]
+                    loads[rv] += demand[u] - demand[v]
+                    route_of[u], route_of[v] = rv, ru
+                    pos_of[u], pos_of[v] = pos_of[v], pos_of[u]
+                    return [u, v, pu, nu, pv, nv]
+
+            # 2-opt within a route: reverse the path between u and v so they become adjacent
+            if same_route:
+                i, j = sorted((pos_of[u], pos_of[v]))
+                a, b = routes[ru][i], routes[ru][j]
+                na, nb = next_(a), next_(b)
+                if nb != a and na != b:
+                    delta = d(a, b) + d(na, nb) - d(a, na) - d(b, nb)
+                    if delta < -EPSILON:
+                        routes[ru][i+1:j+1] = routes[ru][i+1:j+1][::-1]
+                        index_route(ru)
+                        return [a, b, na, nb]
+
+            # or-opt: move the segment of 2 or 3 customers starting at u after v
+            for length in (2, 3):
+                iu = pos_of[u]
+                segment = routes[ru][iu:iu+length]
+                if len(segment) < length or v in segment or v == pu:
+                    continue
+                segment_load = sum(demand[c] for c in segment)
+                if not same_route and loads[rv] + segment_load > capacity:
+                    continue
+                last = segment[-1]
+                after = next_(last)
+                delta = d(pu, after) - d(pu, u) - d(last, after) + d(v, u) + d(last, nv) - d(v, nv)
+                if delta < -EPSILON:
+                    move_segment(segment, v, before=False)
+                    return [u, last, v, pu, after, nv]
+
+        return None
+
+    for r in range(len(routes)):
+        index_route(r)
+
+    customers = [c for route in routes for c in route]
+    active = deque(customers)
+    looking = [False] * vrp.location_count()
+    for c in customers:
+        looking[c] = True
+
+    while active:
+        if deadline is not None and perf_counter() > deadline:
+            break
+
+        u = active.popleft()
+        looking[u] = False
+
+        touched = try_moves(u)
+        if touched is not None:
+            for c in touched:
+                if c != depot and not looking[c]:
+                    looking[c] = True
+                    active.append(c)
+
+    return [route for route in routes if route]
+
+class LocalSearch:
+    """ memetic improvement step of the GA: improves offspring (with probability rate) and optionally the fittest
+    individual, spending at most time_budget seconds per generation"""
+
+    def __init__(self, vrp: VRP, rate=0.1, time_budget: Optional[float] = None, neighbors=10, elite=False):
+        self.vrp = vrp
+        self.rate = rate
+        self.time_budget = time_budget
+        self.elite = elite
+        self.neighbors = vrp.nearest_neighbors(neighbors).tolist()
+
+        self.applied = 0
+        self.improved = 0
+        self.time_spent = 0.0
+
+    def __str__(self):
+        return f"APPLIED={self.applied} | IMPROVED={self.improved} | TIME={self.time_spent:.2f}s"
+
+    def improve(self, population: Population, indices, deadline: Optional[float] = None) -> List[int]:
+        """ improves the individuals at indices in place, returns the indices of those that got better"""
+        started = perf_counter()
+        improved = []
+        for i in indices:
+            if deadline is not None and perf_counter() > deadline:
+                break
+
+            main_chromosome = population.main_chromosomes[i]
+            routes = [route[1:-1] for route in self.vrp.decode_routes(main_chromosome.tolist())]
+            cost = sum(population.routes[i][1]) if population.routes[i] is not None else self.vrp.total_distance(main_chromosome)
+
+            # the improved routes are encoded back into a giant tour, which the decoder may split differently,
+            # so the result is kept only if the decoded solution is better
+            improved_mc = np.array([c for route in improve_routes(self.vrp, routes, self.neighbors, deadline) for c in route], dtype=np.int32)
+            improved_routes = self.vrp.decompose(improved_mc)
+            self.applied += 1
+            if sum(improved_routes[1]) < cost - EPSILON:
+                population.main_chromosomes[i] = improved_mc
+                population.routes[i] = improved_routes
+                population.solution_fitness[i] = sum(improved_routes[1])
+                improved.append(i)
+
+        self.improved += len(improved)
+        self.time_spent += perf_counter() - started
+        return improved
+
+    def improve_generation(self, population: Population, offspring: Population):
+        """ applies the local search to the offspring of a generation, and to the fittest individual if elite is set"""
+        deadline = perf_counter() + self.time_budget if self.time_budget is not None else None
+
+        if self.elite and len(population) > 0:
+            self.improve(population, [int(np.argmin(population.solution_fitness))], deadline)
+
+        if self.rate > 0:
+            self.improve(offspring, [c for c in range(len(offspring)) if random.random() < self.rate], deadline)
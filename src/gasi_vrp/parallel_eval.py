@@ -0,0 +1,99 @@
+import math
+from multiprocessing import Pool
+from multiprocessing.shared_memory import SharedMemory
+from typing import Callable
+
+import numpy as np
+
+from vrp import VRP
+
+MIN_TASK_ROWS = 16      # fewer rows than this are not worth a task of their own
+PIPELINE_BATCHES = 4    # batches the offspring of a generation are mutated and evaluated in, see evolve
+
+_vrp = None
+_buffers = None
+
+def _init_worker(vrp: VRP, chromosomes_name: str, costs_name: str, capacity: int, chromosome_length: int):
+    global _vrp, _buffers
+    _vrp = vrp
+    chromosomes_shm = SharedMemory(name=chromosomes_name)
+    costs_shm = SharedMemory(name=costs_name)
+    # the SharedMemory objects are kept with the arrays, their memory is unmapped once they are collected
+    _buffers = (chromosomes_shm, costs_shm
+        , np.ndarray((capacity, chromosome_length), dtype=np.int32, buffer=chromosomes_shm.buf)
+        , np.ndarray(capacity, dtype=np.float64, buffer=costs_shm.buf))
+
+def _evaluate_rows(task):
+    lo, hi = task
+    _, _, chromosomes, costs = _buffers
+    costs[lo:hi] = _vrp.total_distances(chromosomes[lo:hi])
+
+class ParallelEvaluator:
+    """ master-worker evaluation of total distances: submitted chromosomes are copied into a shared-memory
+    ring buffer of capacity rows, and a pool of workers writes the distances of row ranges of it to a shared
+    cost buffer, so neither chromosomes nor costs are pickled, and the instance is shared (VRP.share) while
+    the pool exists
+
+    at most capacity rows may be waiting for their costs at any time"""
+
+    def __init__(self, vrp: VRP, workers: int, capacity: int, chromosome_length: int):
+        self.vrp = vrp
+        self.workers = workers
+        self.capacity = capacity
+
+        self._chromosomes_shm = SharedMemory(create=True, size=max(capacity * chromosome_length * 4, 1))
+        self._costs_shm = SharedMemory(create=True, size=max(capacity * 8, 1))
+        self.chromosomes = np.ndarray((capacity, chromosome_length), dtype=np.int32, buffer=self._chromosomes_shm.buf)
+        self.costs = np.ndarray(capacity, dtype=np.float64, buffer=self._costs_shm.buf)
+        self._next = 0
+
+        # the workers attach to the shared instance instead of receiving a copy each
+        self._published = vrp._shared is None
+        vrp.share()
+        self._pool = Pool(workers, initializer=_init_worker
+            , initargs=(vrp, self._chromosomes_shm.name, self._costs_shm.name, capacity, chromosome_length))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._pool is None:
+            return
+        self._pool.close()
+        self._pool.join()
+        self._pool = None
+
+        # the arrays are views of the shared memory, which cannot be unmapped while they exist
+        del self.chromosomes, self.costs
+        self._chromosomes_shm.close()
+        self._chromosomes_shm.unlink()
+        self._costs_shm.close()
+        self._costs_shm.unlink()
+        if self._published:
+            self.vrp.unshare()
+
+    def submit(self, encoded_routes_matrix: np.ndarray) -> Callable[[], np.ndarray]:
+        """ starts computing the total distance of every row on the workers, returns a function that waits
+        for and returns the distances"""
+        rows = len(encoded_routes_matrix)
+        if rows == 0 or rows > self.capacity:
+            distances = self.vrp.total_distances(encoded_routes_matrix) if rows else np.zeros(0)
+            return lambda: distances
+
+        if self._next + rows > self.capacity:
+            self._next = 0
+        lo, hi = self._next, self._next + rows
+        self._next = hi
+        self.chromosomes[lo:hi] = encoded_routes_matrix
+
+        task_rows = max(MIN_TASK_ROWS, math.ceil(rows / self.workers))
+        tasks = [(start, min(start + task_rows, hi)) for start in range(lo, hi, task_rows)]
+        pending = self._pool.map_async(_evaluate_rows, tasks)
+
+        def result() -> np.ndarray:
+            pending.get()
+            return self.costs[lo:hi].copy()
+        return result
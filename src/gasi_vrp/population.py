@@ -0,0 +1,113 @@
+from typing import Tuple, List
+
+import numpy as np
+
+UNKNOWN_FITNESS = 99999999
+
+class Population:
+    """ struct-of-arrays store of a population: one row of main_chromosomes and one entry of every
+    other array per individual"""
+
+    # individuals allocated by all populations so far (views made by window share storage and are not counted)
+    allocated_individuals = 0
+
+    def __init__(self, main_chromosomes: np.ndarray, strategy_chromosomes: np.ndarray):
+        Population.allocated_individuals += len(main_chromosomes)
+        self.main_chromosomes = np.ascontiguousarray(main_chromosomes, dtype=np.int32)
+        self.strategy_chromosomes = np.asarray(strategy_chromosomes, dtype=np.float64)
+        self.solution_fitness = np.full(len(self.main_chromosomes), UNKNOWN_FITNESS, dtype=np.float64)
+        self.social_fitness = np.full(len(self.main_chromosomes), UNKNOWN_FITNESS, dtype=np.float64)
+        self.total_fitness = np.full(len(self.main_chromosomes), UNKNOWN_FITNESS, dtype=np.float64)
+        # (route start positions, route costs) once known, see VRP.decompose; an object array so windows share it
+        self.routes = np.full(len(self.main_chromosomes), None, dtype=object)
+
+    @classmethod
+    def empty(cls, size: int, chromosome_length: int) -> 'Population':
+        return cls(np.zeros((size, chromosome_length), dtype=np.int32), np.zeros(size))
+
+    @classmethod
+    def concatenate(cls, populations: List['Population']) -> 'Population':
+        union = cls(np.concatenate([p.main_chromosomes for p in populations])
+            , np.concatenate([p.strategy_chromosomes for p in populations]))
+        union.solution_fitness[:] = np.concatenate([p.solution_fitness for p in populations])
+        union.social_fitness[:] = np.concatenate([p.social_fitness for p in populations])
+        union.total_fitness[:] = np.concatenate([p.total_fitness for p in populations])
+        union.routes[:] = np.concatenate([p.routes for p in populations])
+        return union
+
+    def __len__(self):
+        return len(self.main_chromosomes)
+
+    def __getitem__(self, index: int) -> 'Individual':
+        return Individual(self, index)
+
+    def __iter__(self):
+        return (Individual(self, i) for i in range(len(self)))
+
+    def take(self, indices) -> 'Population':
+        """ returns a new population with copies of the individuals at indices"""
+        taken = Population(self.main_chromosomes[indices], self.strategy_chromosomes[indices])
+        taken.copy_fitness(np.arange(len(taken)), self, indices)
+        return taken
+
+    def truncate(self, size: int) -> 'Population':
+        """ returns the first size individuals, sharing their array storage"""
+        return self.window(0, size)
+
+    def window(self, start: int, stop: int) -> 'Population':
+        """ returns the individuals start to stop-1, sharing their array storage"""
+        window = Population.__new__(Population)
+        window.main_chromosomes = self.main_chromosomes[start:stop]
+        window.strategy_chromosomes = self.strategy_chromosomes[start:stop]
+        window.solution_fitness = self.solution_fitness[start:stop]
+        window.social_fitness = self.social_fitness[start:stop]
+        window.total_fitness = self.total_fitness[start:stop]
+        window.routes = self.routes[start:stop]
+        return window
+
+    def copy_fitness(self, indices, source: 'Population', source_indices):
+        self.solution_fitness[indices] = source.solution_fitness[source_indices]
+        self.social_fitness[indices] = source.social_fitness[source_indices]
+        self.total_fitness[indices] = source.total_fitness[source_indices]
+        for i, j in zip(np.atleast_1d(indices).tolist(), np.atleast_1d(source_indices).tolist()):
+            self.routes[i] = source.routes[j]
+
+    def assign(self, indices, source: 'Population', source_indices):
+        """ overwrites the individuals at indices with those at source_indices of source"""
+        self.main_chromosomes[indices] = source.main_chromosomes[source_indices]
+        self.strategy_chromosomes[indices] = source.strategy_chromosomes[source_indices]
+        self.copy_fitness(indices, source, source_indices)
+
+class Individual:
+    """ lightweight view of one member of a Population"""
+    __slots__ = ('_population', '_index')
+
+    def __init__(self, population: Population, index: int):
+        self._population = population
+        self._index = index
+
+    def __str__(self):
+        main_chromosome, strategy_chromosome = self.chromosomes()
+        return f"({main_chromosome.tolist()}, {strategy_chromosome}) || {self.solution_fitness} || {self.social_fitness}"
+
+    @property
+    def index(self) -> int:
+        return self._index
+
+    @property
+    def solution_fitness(self) -> float:
+        return float(self._population.solution_fitness[self._index])
+
+    @property
+    def social_fitness(self) -> float:
+        return float(self._population.social_fitness[self._index])
+
+    def chromosomes(self) -> Tuple[np.ndarray, float]:
+        return (self._population.main_chromosomes[self._index], float(self._population.strategy_chromosomes[self._index]))
+
+    def fitness(self) -> float:
+        return float(self._population.total_fitness[self._index])
+
+    def update_fitness_parts(self, solution_fitness, social_fitness):
+        self._population.solution_fitness[self._index] = solution_fitness
+        self._population.social_fitness[self._index] = social_fitness
@@ -0,0 +1,129 @@
+import json
+from contextlib import nullcontext
+from time import perf_counter
+from typing import Callable, Dict, Optional, TextIO
+
+from population import Population
+
+# phases of a generation timed by evolve
+EVALUATION = 'evaluation'
+GAME_PLAY = 'game play'
+SELECTION = 'selection'
+CROSSOVER = 'crossover'
+MUTATION = 'mutation'
+LOCAL_SEARCH = 'local search'
+REPLACEMENT = 'replacement'
+
+class _Timer:
+    """ context manager adding the time spent in a block to one phase of a profiler"""
+    __slots__ = ('_phases', '_name', '_started')
+
+    def __init__(self, phases: Dict[str, float], name: str):
+        self._phases = phases
+        self._name = name
+
+    def __enter__(self):
+        self._started = perf_counter()
+
+    def __exit__(self, *exc):
+        self._phases[self._name] = self._phases.get(self._name, 0.0) + perf_counter() - self._started
+
+class Profiler:
+    """ times the phases of every generation and counts evaluations and allocated individuals,
+    every interval generations it emits a record of the generations since the previous one as a
+    JSON line to sink and/or to callback
+
+    record: {'generation', 'generations', 'seconds', 'phases': {phase: seconds}, 'evaluations',
+    'allocated individuals', 'evaluations per second', 'best cost'}"""
+
+    def __init__(self, sink: Optional[TextIO] = None, interval: Optional[int] = 100
+            , callback: Optional[Callable[[dict], None]] = None):
+        self.sink = sink
+        self.interval = interval
+        self.callback = callback
+
+        self.generation = 0
+        self.reset()
+
+    def reset(self):
+        """ starts a new interval"""
+        self.phases: Dict[str, float] = {}
+        self.counters: Dict[str, int] = {'evaluations': 0, 'allocated individuals': 0}
+        self.generations = 0
+        self._started = perf_counter()
+        self._allocated = Population.allocated_individuals
+
+    def count_allocations(self):
+        """ counts the individuals allocated in this process since the last call"""
+        self.count('allocated individuals', Population.allocated_individuals - self._allocated)
+        self._allocated = Population.allocated_individuals
+
+    def phase(self, name: str) -> _Timer:
+        return _Timer(self.phases, name)
+
+    def count(self, name: str, n: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def add(self, other: 'Profiler'):
+        """ adds the phases and counters of other (e.g. the profiler of an island epoch) to this interval,
+        phases of islands running side by side add up to more than the elapsed time"""
+        for name, seconds in other.phases.items():
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+        for name, n in other.counters.items():
+            self.count(name, n)
+
+    def end_generation(self, best_cost: float, generations: int = 1):
+        self.generation += generations
+        self.generations += generations
+        if self.interval and self.generations >= self.interval:
+            self.emit(best_cost)
+
+    def emit(self, best_cost: Optional[float] = None):
+        """ emits the record of the generations since the previous record"""
+        if self.generations == 0:
+            return
+
+        self.count_allocations()
+        seconds = perf_counter() - self._started
+        record = {
+            'generation': self.generation,
+            'generations': self.generations,
+            'seconds': round(seconds, 6),
+            'phases': {name: round(t, 6) for name, t in self.phases.items()},
+            **self.counters,
+            'evaluations per second': round(self.counters['evaluations'] / seconds, 1) if seconds > 0 else None,
+            'best cost': best_cost
+        }
+
+        if self.sink is not None:
+            self.sink.write(json.dumps(record) + '\n')
+            self.sink.flush()
+        if self.callback is not None:
+            self.callback(record)
+        self.reset()
+
+class NullProfiler(Profiler):
+    """ profiler that does nothing, used when a run is not profiled"""
+
+    def __init__(self):
+        super().__init__(interval=None)
+
+    def phase(self, name: str):
+        return nullcontext()
+
+    def count(self, name: str, n: int = 1):
+        pass
+
+    def count_allocations(self):
+        pass
+
+    def add(self, other: Profiler):
+        pass
+
+    def end_generation(self, best_cost: float, generations: int = 1):
+        pass
+
+    def emit(self, best_cost: Optional[float] = None):
+        pass
+
+NULL_PROFILER = NullProfiler()
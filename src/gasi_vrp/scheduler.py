@@ -0,0 +1,101 @@
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# mutation operators the scheduler chooses between, see mutate
+INVERSION = 'inversion'     # reverses a segment of the main chromosome
+GAUSS = 'gauss'             # perturbs the strategy chromosome
+NO_MUTATION = 'none'        # leaves the child as crossover made it
+OPERATORS = (INVERSION, GAUSS, NO_MUTATION)
+
+class OperatorScheduler:
+    """ adaptive operator selection for the mutation of offspring: the probability of every operator follows its
+    reward, the solution fitness the children it was applied to gained over their better parent per CPU-second
+    spent on them (the operator itself plus an equal share of crossover, local search and evaluation)
+
+    gains and seconds are summed with exponential decay over generations (improvements are rare and sparse, so the
+    ratio of the sums is much steadier than an average of per-generation ratios), their ratio is the reward of an
+    operator and rewards are turned into probabilities by probability matching; every operator keeps at least
+    min_probability so it can still prove itself later; the initial probabilities follow mutation_rate, split
+    evenly between inversion and gauss. As rewards depend on measured time, runs with a scheduler are not
+    repeatable exactly, even with the same seed
+
+    every interval generations a record of the probabilities, rewards and uses since the previous record is appended
+    to history: {'generation', 'probabilities': {operator: p}, 'rewards': {operator: gain/s}, 'uses': {operator: n}}"""
+
+    def __init__(self, mutation_rate=0.7, min_probability=0.05, decay=0.05, interval: Optional[int] = 100):
+        self.min_probability = min_probability
+        self.decay = decay
+        self.interval = interval
+
+        probabilities = np.array([mutation_rate / 2, mutation_rate / 2, 1 - mutation_rate])
+        probabilities = np.maximum(probabilities, min_probability)
+        self.probabilities = probabilities / probabilities.sum()
+        self.gains = np.zeros(len(OPERATORS))
+        self.seconds = np.zeros(len(OPERATORS))
+        self.uses = np.zeros(len(OPERATORS), dtype=np.int64)
+        self.generation = 0
+        self.history: List[dict] = []
+
+    def __str__(self):
+        return ' | '.join(f"{op.upper()}={p:.3f}" for op, p in zip(OPERATORS, self.probabilities))
+
+    def mutation_rate(self) -> float:
+        """ returns the probability that a child is mutated at all"""
+        return 1.0 - float(self.probabilities[OPERATORS.index(NO_MUTATION)])
+
+    def inversion_rate(self) -> float:
+        """ returns the probability that a mutated child is mutated by inversion rather than gauss"""
+        inversion, gauss = self.probabilities[OPERATORS.index(INVERSION)], self.probabilities[OPERATORS.index(GAUSS)]
+        return float(inversion / (inversion + gauss))
+
+    def rewards(self) -> np.ndarray:
+        """ returns the decayed fitness gain per CPU-second of every operator, 0 for operators not used yet"""
+        return np.divide(self.gains, self.seconds, out=np.zeros(len(OPERATORS)), where=self.seconds > 0)
+
+    def operator_probabilities(self) -> Dict[str, float]:
+        return {op: round(float(p), 6) for op, p in zip(OPERATORS, self.probabilities)}
+
+    def credit(self, applied: List[Optional[str]], gains: np.ndarray, seconds: np.ndarray):
+        """ rewards the operators applied to the children of a generation (None for no mutation, see mutate)
+        with the fitness gains of the children per second spent on them, and updates the probabilities"""
+        arms = np.array([OPERATORS.index(op or NO_MUTATION) for op in applied], dtype=np.intp)
+        self.uses += np.bincount(arms, minlength=len(OPERATORS))
+        self.gains = (1 - self.decay) * self.gains + np.bincount(arms, weights=gains, minlength=len(OPERATORS))
+        self.seconds = (1 - self.decay) * self.seconds + np.bincount(arms, weights=seconds, minlength=len(OPERATORS))
+
+        # probability matching among the operators used so far, the others keep their probability
+        used = self.seconds > 0
+        rewards = self.rewards()[used]
+        if rewards.sum() > 0:
+            share = self.probabilities[used].sum()
+            floor = min(self.min_probability, share / len(rewards))
+            self.probabilities[used] = floor + (share - floor * len(rewards)) * rewards / rewards.sum()
+
+    def end_generation(self, generations: int = 1):
+        self.generation += generations
+        if self.interval and self.generation % self.interval == 0:
+            self.log()
+
+    def log(self):
+        """ appends a record of the current probabilities and rewards and of the uses since the previous record"""
+        self.history.append({
+            'generation': self.generation,
+            'probabilities': self.operator_probabilities(),
+            'rewards': {op: round(float(r), 3) for op, r in zip(OPERATORS, self.rewards())},
+            'uses': {op: int(n) for op, n in zip(OPERATORS, self.uses)}
+        })
+        self.uses[:] = 0
+
+    def state(self) -> dict:
+        """ returns the state of the scheduler as plain JSON data, see restore"""
+        return {'probabilities': self.probabilities.tolist(), 'gains': self.gains.tolist(), 'seconds': self.seconds.tolist()
+            , 'uses': self.uses.tolist(), 'generation': self.generation, 'history': self.history}
+
+    def restore(self, state: dict):
+        self.probabilities = np.array(state['probabilities'])
+        self.gains = np.array(state['gains'])
+        self.seconds = np.array(state['seconds'])
+        self.uses = np.array(state['uses'], dtype=np.int64)
+        self.generation = state['generation']
+        self.history = state['history']
@@ -0,0 +1,85 @@
+import math
+from typing import Optional, Tuple
+
+import numpy as np
+
+class GridIndex:
+    """ uniform grid over a set of points answering k-nearest-neighbour queries"""
+
+    def __init__(self, coords: np.ndarray, points_per_cell: float = 2.0):
+        self.coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        n = len(self.coords)
+
+        self.origin = self.coords.min(axis=0) if n > 0 else np.zeros(2)
+        extent = (self.coords.max(axis=0) - self.origin) if n > 0 else np.zeros(2)
+        # points_per_cell on average over the bounding box, but at most n / points_per_cell cells along the longer
+        # side, so a thin or collinear instance does not get a huge grid of empty cells
+        n_cells = max(n, 1) / points_per_cell
+        self.cell_size = max(math.sqrt(extent[0] * extent[1] / n_cells), float(extent.max()) / n_cells, 1e-9)
+        self.shape = (extent // self.cell_size).astype(np.int64) + 1
+
+        # points sorted by cell, cell c holds order[cell_start[c]:cell_start[c+1]]
+        cells = self._cells(self.coords)
+        cell_ids = cells[:, 0] * self.shape[1] + cells[:, 1]
+        self.order = np.argsort(cell_ids, kind='stable')
+        self.cell_start = np.searchsorted(cell_ids[self.order], np.arange(self.shape[0] * self.shape[1] + 1))
+
+    def __len__(self):
+        return len(self.coords)
+
+    def _cells(self, points: np.ndarray) -> np.ndarray:
+        cells = ((points - self.origin) // self.cell_size).astype(np.int64)
+        return np.clip(cells, 0, self.shape - 1)
+
+    def _ring(self, cx: int, cy: int, r: int) -> np.ndarray:
+        # points in the cells at Chebyshev distance r from cell (cx, cy)
+        x_lo, x_hi = max(cx - r, 0), min(cx + r, self.shape[0] - 1)
+        y_lo, y_hi = max(cy - r, 0), min(cy + r, self.shape[1] - 1)
+        points = []
+        for x in range(x_lo, x_hi + 1):
+            if r == 0 or x == cx - r or x == cx + r:
+                ys = range(y_lo, y_hi + 1)
+            else:
+                ys = [y for y in (cy - r, cy + r) if y_lo <= y <= y_hi]
+            for y in ys:
+                c = x * self.shape[1] + y
+                points.append(self.order[self.cell_start[c]:self.cell_start[c+1]])
+        return np.concatenate(points) if points else np.empty(0, dtype=np.int64)
+
+    def nearest(self, point: Tuple[float, float], k: int, exclude: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """ returns the indices and distances of the k points nearest to point, closest first"""
+        point = np.asarray(point, dtype=np.float64)
+        k = min(k, len(self) - (exclude is not None))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+
+        cx, cy = self._cells(point[np.newaxis])[0]
+        max_r = int(max(cx, cy, self.shape[0] - 1 - cx, self.shape[1] - 1 - cy))
+        candidates = []
+        found = 0
+        for r in range(max_r + 1):
+            ring = self._ring(cx, cy, r)
+            if exclude is not None:
+                ring = ring[ring != exclude]
+            candidates.append(ring)
+            found += len(ring)
+
+            # points beyond ring r are at least r cells away from the query point
+            if found >= k:
+                indices = np.concatenate(candidates)
+                dx = self.coords[indices, 0] - point[0]
+                dy = self.coords[indices, 1] - point[1]
+                distances = np.sqrt(dx*dx + dy*dy)
+                if r == max_r or np.partition(distances, k - 1)[k - 1] <= r * self.cell_size:
+                    nearest = np.argsort(distances, kind='stable')[:k]
+                    return indices[nearest], distances[nearest]
+
+        raise AssertionError("unreachable: the last ring covers the whole grid")
+
+    def knn(self, k: int) -> np.ndarray:
+        """ returns an (n, k) matrix with the k nearest other points of every point, closest first"""
+        k = min(k, len(self) - 1)
+        neighbors = np.empty((len(self), max(k, 0)), dtype=np.int64)
+        for i in range(len(self)):
+            neighbors[i], _ = self.nearest(self.coords[i], k, exclude=i)
+        return neighbors
@@ -0,0 +1,78 @@
+import math
+import time
+from typing import Optional
+
+# reasons a run ended
+GENERATIONS = 'generations'     # ran all num_generations
+TIME_LIMIT = 'time limit'
+STAGNATION = 'stagnation'
+TARGET = 'target'
+
+class StopCondition:
+    """ decides when evolve ends before num_generations: once the time limit has passed, once the best cost
+    has not improved for stagnation generations, or once the best cost is within target_gap of target_cost
+
+    also counts the generations and evaluations of the run, which ga_social_interaction_vrp reports"""
+
+    def __init__(self, time_limit: Optional[float] = None, stagnation: Optional[int] = None
+            , target_cost: Optional[float] = None, target_gap: float = 0.0):
+        self.time_limit = time_limit
+        self.stagnation = stagnation
+        self.target_cost = target_cost
+        self.target_gap = target_gap
+
+        # wall-clock time, so the deadline means the same in the island worker processes
+        self.started = time.time()
+        self.deadline = self.started + time_limit if time_limit is not None else None
+
+        self.best_cost = math.inf
+        self.stagnant = 0
+        self.generations = 0
+        self.evaluations = 0
+        self.reason: Optional[str] = None
+
+    def __str__(self):
+        summary = self.summary()
+        return f"STOP={summary['stop reason']} | GENERATIONS={summary['generations']} | EVALUATIONS={summary['evaluations']}" \
+            f" | TIME={summary['seconds']:.2f}s"
+
+    def elapsed(self) -> float:
+        return time.time() - self.started
+
+    def epoch(self) -> 'StopCondition':
+        """ returns a fresh condition with the same deadline and target for one epoch of an island,
+        stagnation is left to the condition of the whole run"""
+        epoch = StopCondition(target_cost=self.target_cost, target_gap=self.target_gap)
+        epoch.deadline = self.deadline
+        return epoch
+
+    def count(self, evaluations: int):
+        """ records evaluations made outside of a generation (e.g. of the initial population)"""
+        self.evaluations += evaluations
+
+    def update(self, best_cost: float, generations: int = 1, evaluations: int = 0) -> bool:
+        """ records generations more generations ending with best_cost, returns True if the run should stop"""
+        self.generations += generations
+        self.evaluations += evaluations
+
+        if best_cost < self.best_cost:
+            self.best_cost = best_cost
+            self.stagnant = 0
+        else:
+            self.stagnant += generations
+
+        if self.target_cost is not None and self.best_cost <= self.target_cost * (1 + self.target_gap):
+            self.reason = TARGET
+        elif self.stagnation is not None and self.stagnant >= self.stagnation:
+            self.reason = STAGNATION
+        elif self.deadline is not None and time.time() >= self.deadline:
+            self.reason = TIME_LIMIT
+        return self.reason is not None
+
+    def summary(self) -> dict:
+        return {
+            'stop reason': self.reason or GENERATIONS,
+            'generations': self.generations,
+            'evaluations': self.evaluations,
+            'seconds': round(self.elapsed(), 3)
+        }
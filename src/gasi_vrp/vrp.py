@@ -2,39 +2,281 @@ import sys
 import random
 import math
 import csv
+import hashlib
+import json
+import os
+import shutil
+import tempfile
 
-from typing import Tuple, List
+from contextlib import contextmanager
+from multiprocessing.shared_memory import SharedMemory
+from typing import NamedTuple, Tuple, List, Optional
 from functools import reduce
-from itertools import permutations
+from itertools import permutations, chain
+
+import numpy as np
 
 from location import Location
-from utils import euclidean_distance
+from fitness_cache import RouteMemo
+from spatial import GridIndex
+from vrp_data_reader import read_file
+
+# storage layouts of the distance matrix
+DENSE = 'dense'             # full n x n matrix
+TRIANGULAR = 'triangular'   # condensed upper triangle, n(n-1)/2 entries
+SPARSE = 'sparse'           # no matrix, distances are computed from the coordinates on demand
+
+DISTANCE_BLOCK_SIZE = 1 << 22   # number of distances computed per vectorized step
+
+# ways of splitting an encoded solution (a giant tour of all customers) into vehicle routes
+GREEDY = 'greedy'       # a new vehicle as soon as the next customer does not fit on the current one
+OPTIMAL = 'optimal'     # the cheapest division of the giant tour into routes (Prins' split)
+
+SHARED_ARRAYS = ('coords', 'demand', 'distance', 'depot_distance')   # the arrays VRP.share publishes
+
+class SharedInstance(NamedTuple):
+    """ what a process needs to attach to an instance published by VRP.share, small enough to pickle"""
+    capacity: float
+    depot_id: int
+    storage: str
+    split: str
+    arrays: Tuple[Tuple[str, str, Tuple[int, ...], str], ...]   # (attribute, shared memory name, shape, dtype)
 
 class VRP:
-    def __init__(self, vehicle_capacity: float, locs: List[Location]):
+    def __init__(self, vehicle_capacity: float, locs: List[Location], dtype=np.float64, storage=DENSE
+            , distance: Optional[np.ndarray] = None, split=GREEDY):
         sorted_locs = sorted(locs, key=lambda l: l.id)
 
-        self.locs_dictionary = {l.id: l for l in sorted_locs}
+        self._locs_dictionary = {l.id: l for l in sorted_locs}
         self.depot_id = next(l for l in sorted_locs if l.is_depot).id
         self.max_vehicle_capacity =  vehicle_capacity
-        self.distance = self._get_distance_matrix(sorted_locs)
+        self.coords = np.array([l.coords for l in sorted_locs], dtype=np.float64).reshape(-1, 2)
+        self.demand = np.array([l.request_size for l in sorted_locs], dtype=np.float64)
+        self.storage = storage
+        self.split = split
+        self.distance = distance if distance is not None else self._get_distance_matrix(self.coords, dtype, storage)
+        self.depot_distance = self.edge_costs(np.arange(len(sorted_locs)), self.depot_id).astype(np.float64)
+        self._spatial_index = None
+        self._neighbors = None
+        self._max_route_length = None
+        self.route_memo: Optional[RouteMemo] = None
+        self._shared = None
+        self._shared_memory = []
+        self._owner = False
+
+    @property
+    def locs_dictionary(self):
+        # instances attached to shared memory rebuild their locations on first use
+        if self._locs_dictionary is None:
+            self._locs_dictionary = {i: Location(i, tuple(c), d, i == self.depot_id)
+                for i, (c, d) in enumerate(zip(self.coords.tolist(), self.demand.tolist()))}
+        return self._locs_dictionary
+
+    def share(self) -> SharedInstance:
+        """ publishes the distance matrix, coordinates, demand and depot distances in shared memory blocks and
+        returns their description, from then on the instance itself uses the shared arrays and is pickled as
+        that description, so worker processes attach to the blocks instead of receiving copies
+
+        the blocks exist until unshare is called by this process, see VRP.shared"""
+        if self._shared is not None:
+            return self._shared
+
+        arrays = []
+        for attribute in SHARED_ARRAYS:
+            array = getattr(self, attribute)
+            if array is None:
+                continue
+            shm = SharedMemory(create=True, size=max(array.nbytes, 1))
+            self._shared_memory.append(shm)
+            shared = np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)
+            shared[...] = array
+            setattr(self, attribute, shared)
+            arrays.append((attribute, shm.name, array.shape, array.dtype.str))
+
+        self._shared = SharedInstance(self.max_vehicle_capacity, self.depot_id, self.storage, self.split, tuple(arrays))
+        self._owner = True
+        return self._shared
+
+    def unshare(self):
+        """ detaches the instance from its shared memory blocks, the process that published them (VRP.share)
+        keeps private copies of the arrays and removes the blocks, an attached process only unmaps them"""
+        if self._shared is None:
+            return
+
+        for attribute, _, _, _ in self._shared.arrays:
+            # the blocks cannot be unmapped while views of them exist
+            setattr(self, attribute, np.array(getattr(self, attribute)) if self._owner else None)
+        for shm in self._shared_memory:
+            shm.close()
+            if self._owner:
+                shm.unlink()
+        self._shared = None
+        self._shared_memory = []
+        self._owner = False
+
+    @contextmanager
+    def shared(self):
+        """ shares the instance for the duration of a with block, e.g. while a pool of workers uses it"""
+        published = self._shared is None
+        self.share()
+        try:
+            yield self._shared
+        finally:
+            if published:
+                self.unshare()
+
+    @classmethod
+    def attach(cls, shared: SharedInstance) -> 'VRP':
+        """ returns the instance published by VRP.share, its arrays are views of the shared memory blocks"""
+        vrp = cls.__new__(cls)
+        vrp._locs_dictionary = None
+        vrp.depot_id = shared.depot_id
+        vrp.max_vehicle_capacity = shared.capacity
+        vrp.storage = shared.storage
+        vrp.split = shared.split
+        vrp.distance = None
+        vrp._spatial_index = None
+        vrp._neighbors = None
+        vrp._max_route_length = None
+        vrp.route_memo = None
+        vrp._shared = shared
+        vrp._shared_memory = []
+        vrp._owner = False
+
+        for attribute, name, shape, dtype in shared.arrays:
+            shm = SharedMemory(name=name)
+            vrp._shared_memory.append(shm)
+            setattr(vrp, attribute, np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf))
+        return vrp
+
+    def __reduce_ex__(self, protocol):
+        if self._shared is not None:
+            return (VRP.attach, (self._shared,))
+        return super().__reduce_ex__(protocol)
 
     def __str__(self) -> str:
         return f"VEHiCLE CAPACITY={self.max_vehicle_capacity}\n\nLOCATIONS:\n" + '\n'.join(str(l) for l in self.locs_dictionary.values())
 
-    def _get_distance_matrix(self, sorted_locs: List[Location]) -> List[List[float]]:
-        n = len(sorted_locs)
-        matrix = [[0.0 for _ in range(n)] for _ in range(n)]
-        for i in range(n):
-            for j in range(n):
-                matrix[i][j] = euclidean_distance(sorted_locs[i], sorted_locs[j])
-        return matrix
+    def save(self, path: str):
+        """ writes the instance in a compiled binary form to the directory path, see VRP.load"""
+        os.makedirs(path, exist_ok=True)
+        ids = np.array(list(self.locs_dictionary.keys()), dtype=np.int64)
+        np.save(os.path.join(path, 'ids.npy'), ids)
+        np.save(os.path.join(path, 'coords.npy'), self.coords)
+        np.save(os.path.join(path, 'demand.npy'), self.demand)
+        if self.distance is not None:
+            np.save(os.path.join(path, 'distance.npy'), self.distance)
+        with open(os.path.join(path, 'meta.json'), 'w') as meta_file:
+            json.dump({'capacity': self.max_vehicle_capacity, 'depot_id': self.depot_id, 'storage': self.storage}, meta_file)
+
+    @classmethod
+    def load(cls, path: str, mmap_mode: Optional[str] = 'r', split=GREEDY) -> 'VRP':
+        """ reads an instance written by VRP.save, the distance matrix is memory-mapped unless mmap_mode is None
+        so that processes loading the same instance share its pages"""
+        with open(os.path.join(path, 'meta.json')) as meta_file:
+            meta = json.load(meta_file)
+        ids = np.load(os.path.join(path, 'ids.npy')).tolist()
+        coords = np.load(os.path.join(path, 'coords.npy')).tolist()
+        demand = np.load(os.path.join(path, 'demand.npy')).tolist()
+        distance = np.load(os.path.join(path, 'distance.npy'), mmap_mode=mmap_mode) if meta['storage'] != SPARSE else None
+
+        locs = [Location(i, tuple(c), d, i == meta['depot_id']) for i, c, d in zip(ids, coords, demand)]
+        return cls(meta['capacity'], locs, storage=meta['storage'], distance=distance, split=split)
+
+    @staticmethod
+    def _get_distance_matrix(coords: np.ndarray, dtype, storage: str) -> np.ndarray:
+        n = len(coords)
+        x, y = coords[:, 0], coords[:, 1]
+
+        if storage == DENSE:
+            # blocks of rows keep the temporaries small next to the n x n result
+            matrix = np.empty((n, n), dtype=dtype)
+            block = max(1, DISTANCE_BLOCK_SIZE // max(n, 1))
+            for start in range(0, n, block):
+                dx = x[start:start+block, np.newaxis] - x
+                dy = y[start:start+block, np.newaxis] - y
+                matrix[start:start+block] = np.sqrt(dx*dx + dy*dy)
+            return matrix
+
+        if storage == TRIANGULAR:
+            condensed = np.empty(n*(n-1)//2, dtype=dtype)
+            for i in range(n - 1):
+                offset = n*i - i*(i+1)//2
+                dx = x[i+1:] - x[i]
+                dy = y[i+1:] - y[i]
+                condensed[offset:offset+n-i-1] = np.sqrt(dx*dx + dy*dy)
+            return condensed
+
+        if storage == SPARSE:
+            return None
+
+        raise ValueError(f"Unknown distance matrix storage '{storage}'")
 
     def location_count(self):
         """ returns the number of locations (including depot)"""
-        return len(self.distance)
+        return len(self.coords)
+
+    def fingerprint(self) -> dict:
+        """ returns the capacity, the number of locations and a hash of the coordinates and demands, as JSON data
+        that tells instances apart (e.g. to check that a checkpoint belongs to the instance it is resumed with)"""
+        digest = hashlib.sha1(np.ascontiguousarray(self.coords, dtype=np.float64).tobytes())
+        digest.update(np.ascontiguousarray(self.demand, dtype=np.float64).tobytes())
+        return {'capacity': self.max_vehicle_capacity, 'locations': self.location_count(), 'hash': digest.hexdigest()}
+
+    def edge_costs(self, from_ids, to_ids) -> np.ndarray:
+        """ returns the distances of the edges from_ids[k] -> to_ids[k] (arrays of any matching shape)"""
+        from_ids = np.asarray(from_ids, dtype=np.intp)
+        to_ids = np.asarray(to_ids, dtype=np.intp)
+
+        if self.storage == DENSE:
+            return self.distance[from_ids, to_ids]
+
+        if self.storage == SPARSE:
+            dx = self.coords[from_ids, 0] - self.coords[to_ids, 0]
+            dy = self.coords[from_ids, 1] - self.coords[to_ids, 1]
+            return np.sqrt(dx*dx + dy*dy)
+
+        # condensed upper triangle: entry (i, j) with i < j lives at n*i - i*(i+1)/2 + j - i - 1
+        n = len(self.coords)
+        lo = np.minimum(from_ids, to_ids)
+        hi = np.maximum(from_ids, to_ids)
+        same = lo == hi
+        index = n*lo - lo*(lo+1)//2 + hi - lo - 1
+        return np.where(same, 0.0, self.distance[np.where(same, 0, index)])
+
+    def edge_cost(self, from_id: int, to_id: int) -> float:
+        """ scalar edge_costs for the hot loops that look up one edge at a time"""
+        if self.storage == DENSE:
+            return self.distance.item(from_id, to_id)
+
+        if self.storage == SPARSE:
+            dx = self.coords.item(from_id, 0) - self.coords.item(to_id, 0)
+            dy = self.coords.item(from_id, 1) - self.coords.item(to_id, 1)
+            return math.sqrt(dx*dx + dy*dy)
+
+        if from_id == to_id:
+            return 0.0
+        lo, hi = min(from_id, to_id), max(from_id, to_id)
+        return float(self.distance.item(len(self.coords)*lo - lo*(lo+1)//2 + hi - lo - 1))
+
+    def spatial_index(self) -> GridIndex:
+        if self._spatial_index is None:
+            self._spatial_index = GridIndex(self.coords)
+        return self._spatial_index
+
+    def nearest_neighbors(self, k: int) -> np.ndarray:
+        """ returns an (n, k) matrix with the ids of the k locations nearest to every location, closest first"""
+        if self._neighbors is None or self._neighbors.shape[1] < k:
+            self._neighbors = self.spatial_index().knn(k)
+        return self._neighbors[:, :k]
 
     def decode_routes(self, encoded_routes):
+        if self.split == OPTIMAL:
+            starts = self.optimal_split(encoded_routes)
+            for start, end in zip(starts, starts[1:] + [len(encoded_routes)]):
+                yield [self.depot_id] + list(encoded_routes[start:end]) + [self.depot_id]
+            return
+
         veh_route = [self.depot_id]   # current route, intialized with depot
         veh_capacity = 0              
 
@@ -56,11 +298,186 @@ class VRP:
             veh_route.append(self.depot_id)
             yield veh_route
 
+    def split_routes(self, encoded_routes_matrix: np.ndarray) -> np.ndarray:
+        """ returns a boolean matrix that is True where decode_routes opens a new vehicle, one row per encoded solution"""
+        demand = self.demand[encoded_routes_matrix]
+        new_vehicle = np.zeros(demand.shape, dtype=bool)
+        veh_capacity = np.zeros(len(demand))
+
+        # the greedy split is sequential along a solution but independent across solutions,
+        # so walk the positions once and update every solution at the same time
+        for j in range(demand.shape[1]):
+            veh_capacity += demand[:, j]
+            exceeded = veh_capacity > self.max_vehicle_capacity
+            new_vehicle[:, j] = exceeded
+            veh_capacity[exceeded] = demand[exceeded, j]
+
+        return new_vehicle
+
+    def max_route_length(self) -> int:
+        """ returns the most customers a single vehicle can serve, i.e. how many of the smallest demands fit"""
+        if self._max_route_length is None:
+            customers = np.delete(self.demand, self.depot_id)
+            self._max_route_length = max(int(np.searchsorted(np.cumsum(np.sort(customers)), self.max_vehicle_capacity, side='right')), 1)
+        return self._max_route_length
+
+    def optimal_split(self, encoded_routes) -> List[int]:
+        """ returns the start positions of the routes of the cheapest split of encoded_routes (Prins' split):
+        a shortest path over the positions of the giant tour, where an arc s -> e+1 is the route serving
+        the customers at positions s to e, as long as they fit on one vehicle"""
+        tour = np.asarray(encoded_routes, dtype=np.intp)
+        m = len(tour)
+        if m == 0:
+            return []
+
+        # prefix sums: distance along the tour up to position k, and demand before position k
+        along = np.zeros(m)
+        along[1:] = np.cumsum(self.edge_costs(tour[:-1], tour[1:]), dtype=np.float64)
+        along = along.tolist()
+        demand = self.demand[tour].tolist()
+        depot = self.depot_distance[tour].tolist()
+        capacity = self.max_vehicle_capacity
+
+        cost = [0.0] + [math.inf] * m
+        previous = [0] * (m + 1)
+        for e in range(m):
+            load = 0.0
+            # routes ending at e, from the shortest to the longest, until the vehicle is full
+            for s in range(e, -1, -1):
+                load += demand[s]
+                if load > capacity:
+                    break
+                c = cost[s] + depot[s] + along[e] - along[s] + depot[e]
+                if c < cost[e+1]:
+                    cost[e+1] = c
+                    previous[e+1] = s
+
+        starts = []
+        e = m
+        while e > 0:
+            e = previous[e]
+            starts.append(e)
+        return starts[::-1]
+
+    def optimal_split_distances(self, encoded_routes_matrix: np.ndarray) -> np.ndarray:
+        """ returns the total distance of the optimal split of every row of a 2-D array of encoded solutions,
+        the shortest paths of all rows advance together one position at a time"""
+        routes = np.asarray(encoded_routes_matrix, dtype=np.intp)
+        rows, m = routes.shape
+
+        # positions along the first axis, so the window of start positions of every step is a contiguous block
+        tour = routes.T
+        along = np.zeros((m, rows))
+        along[1:] = np.cumsum(self.edge_costs(tour[:-1], tour[1:]), axis=0, dtype=np.float64)
+        demand = np.zeros((m + 1, rows))
+        demand[1:] = np.cumsum(self.demand[tour], axis=0)
+        depot = self.depot_distance[tour]
+
+        # cost of a route over positions s..e = depot[s] - along[s] + along[e] + depot[e]
+        head = depot - along
+        tail = along + depot
+        max_load = demand + self.max_vehicle_capacity
+
+        cost = np.empty((m + 1, rows))
+        cost[0] = 0.0
+        length = self.max_route_length()
+        for e in range(m):
+            lo = max(e - length + 1, 0)
+            c = cost[lo:e+1] + head[lo:e+1]
+            np.putmask(c, max_load[lo:e+1] < demand[e+1], np.inf)
+            np.add(c.min(axis=0), tail[e], out=cost[e+1])
+
+        return cost[m]
+
+    def total_distances(self, encoded_routes_matrix) -> np.ndarray:
+        """ returns the total distance of every row of a 2-D array of encoded solutions"""
+        routes = np.asarray(encoded_routes_matrix, dtype=np.intp)
+        if routes.size == 0:
+            return np.zeros(len(routes))
+        if self.split == OPTIMAL:
+            return self.optimal_split_distances(routes)
+
+        previous = np.empty_like(routes)
+        previous[:, 0] = self.depot_id
+        previous[:, 1:] = routes[:, :-1]
+
+        # edge from the previous location, or via the depot wherever a new vehicle is opened
+        edges = self.edge_costs(previous, routes).astype(np.float64)
+        new_vehicle = self.split_routes(routes)
+        edges[new_vehicle] = self.depot_distance[previous[new_vehicle]] + self.depot_distance[routes[new_vehicle]]
+
+        return edges.sum(axis=1) + self.depot_distance[routes[:, -1]]
+
+    def _route_end(self, encoded_routes, start: int) -> int:
+        # position after the last location the greedy decoder puts on the vehicle opened at start
+        veh_capacity = self.demand[encoded_routes[start]]
+        end = start + 1
+        while end < len(encoded_routes) and veh_capacity + self.demand[encoded_routes[end]] <= self.max_vehicle_capacity:
+            veh_capacity += self.demand[encoded_routes[end]]
+            end += 1
+        return end
+
+    def _route_cost(self, encoded_routes, start: int, end: int) -> float:
+        if self.route_memo is not None:
+            key = self.route_memo.key(encoded_routes[start:end])
+            cached = self.route_memo.get(key)
+            if cached is not None:
+                return cached[0]
+
+        route = np.asarray(encoded_routes[start:end], dtype=np.intp)
+        cost = float(self.depot_distance[route[0]] + self.edge_costs(route[:-1], route[1:]).sum(dtype=np.float64) + self.depot_distance[route[-1]])
+        if self.route_memo is not None:
+            self.route_memo.put(key, (cost, float(self.demand[route].sum())))
+        return cost
+
+    def decompose(self, encoded_routes) -> Tuple[List[int], List[float]]:
+        """ returns the start position and the distance of every route decode_routes produces"""
+        if self.split == OPTIMAL:
+            starts = self.optimal_split(encoded_routes)
+            ends = starts[1:] + [len(encoded_routes)]
+            return starts, [self._route_cost(encoded_routes, start, end) for start, end in zip(starts, ends)]
+
+        starts, costs = [], []
+        start = 0
+        while start < len(encoded_routes):
+            end = self._route_end(encoded_routes, start)
+            starts.append(start)
+            costs.append(self._route_cost(encoded_routes, start, end))
+            start = end
+        return starts, costs
+
     def total_distance(self, encoded_routes):
-        total_distance = 0
-        for route in self.decode_routes(encoded_routes):
-            route_distance = 0
-            for j in range(1, len(route)):
-                route_distance += self.distance[route[j-1]][route[j]]
-            total_distance += route_distance
-        return total_distance
\ No newline at end of file
+        # consecutive routes share the depot, so the decoded routes form a single closed path
+        # (depot -> depot edges have zero length) whose edges are gathered in one pass
+        path = np.fromiter(chain.from_iterable(self.decode_routes(encoded_routes)), dtype=np.intp)
+        return float(self.edge_costs(path[:-1], path[1:]).sum(dtype=np.float64))
+
+def load_instance(path: str, cache_dir: Optional[str] = None, dtype=np.float64, storage=DENSE, split=GREEDY) -> VRP:
+    """ reads an instance from an xml file or a directory written by VRP.save
+
+    with a cache_dir, an xml file is compiled there on first use and loaded from the compiled form
+    afterwards (as long as the file is unchanged)"""
+    if os.path.isdir(path):
+        return VRP.load(path, split=split)
+
+    if cache_dir is None:
+        return VRP(*read_file(path), dtype=dtype, storage=storage, split=split)
+
+    stat = os.stat(path)
+    version = f"{os.path.abspath(path)}|{stat.st_mtime_ns}|{stat.st_size}|{np.dtype(dtype).name}|{storage}"
+    name = os.path.splitext(os.path.basename(path))[0]
+    compiled_path = os.path.join(cache_dir, f"{name}-{hashlib.sha1(version.encode()).hexdigest()[:12]}")
+
+    if not os.path.isdir(compiled_path):
+        # compile next to the cache entry and move it in place in one step, so concurrent
+        # processes never load a half written entry; the first one to finish wins
+        os.makedirs(cache_dir, exist_ok=True)
+        staging_path = tempfile.mkdtemp(dir=cache_dir)
+        os.chmod(staging_path, 0o755)
+        VRP(*read_file(path), dtype=dtype, storage=storage).save(staging_path)
+        try:
+            os.rename(staging_path, compiled_path)
+        except OSError:
+            shutil.rmtree(staging_path, ignore_errors=True)
+
+    return VRP.load(compiled_path, split=split)
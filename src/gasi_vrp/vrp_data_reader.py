@@ -9,9 +9,6 @@ import xml.etree.ElementTree as ET
 
 from location import Location
 
-def _read_vehicle_capacity(root_node: ET.Element) -> float:
-    return float(root_node.find('./fleet/vehicle_profile/capacity').text)
-
 def _read_location_id(network_node: ET.Element) -> int:
     return int(network_node.attrib['id'])-1 # subtract 1 to create a zero based index
 
@@ -21,36 +18,45 @@ def _read_location_coords(network_node: ET.Element) -> Tuple[float, float]:
 
     return (x, y)
 
-def _read_location_capacity(node_id: int, root_node: ET.Element) -> float:
-    return float(root_node.find(f"./requests/request[@node='{node_id+1}']/quantity").text)
-
-def _get_depot_loc(root_node: ET.Element) -> Location:
-    net_node = root_node.find("./network/nodes/node[@type='0']")
-
-    return Location(_read_location_id(net_node), _read_location_coords(net_node), 0, True)
-
-def _get_destination_locs(root_node: ET.Element) -> List[Location]:
-    dest_locs = []
-
-    for network_node in root_node.findall("./network/nodes/node[@type='1']"):
-        node_id = _read_location_id(network_node)
-        dest_locs.append(Location(
-            node_id, 
-            _read_location_coords(network_node),
-            _read_location_capacity(node_id, root_node),
-            False))
-
-    return dest_locs
+def _read_request(request_node: ET.Element) -> Tuple[int, float]:
+    node_id = int(request_node.attrib['node'])-1 # subtract 1 to create a zero based index
+    return (node_id, float(request_node.find('./quantity').text))
 
 def read_file(location_data_path: str) -> Tuple[int, List[Location]]:
-    root = ET.parse(location_data_path).getroot()
+    capacity = None
+    nodes = []      # (id, coords, is depot) in document order
+    demands = {}    # id -> requested quantity
+
+    # stream the file once, dropping every node and request element as soon as it is read
+    path = []
+    for event, elem in ET.iterparse(location_data_path, events=('start', 'end')):
+        if event == 'start':
+            path.append(elem)
+            continue
+
+        path.pop()
+        tag = elem.tag
+        if tag == 'node' and len(path) > 0 and path[-1].tag == 'nodes':
+            nodes.append((_read_location_id(elem), _read_location_coords(elem), elem.attrib.get('type') == '0'))
+        elif tag == 'request':
+            node_id, quantity = _read_request(elem)
+            demands[node_id] = quantity
+        elif tag == 'capacity' and capacity is None and len(path) > 0 and path[-1].tag == 'vehicle_profile':
+            capacity = float(elem.text)
+        else:
+            continue
+
+        elem.clear()
+        if path:
+            path[-1].remove(elem)
+
+    # destination locs in document order followed by the depot
     all_locs = []
-
-    #Parse vehicle capacity
-    capacity = _read_vehicle_capacity(root)
-
-    # Parse depot and destination locs and sort by id
-    non_depot_locs = all_locs.extend(_get_destination_locs(root))
-    depot = all_locs.append(_get_depot_loc(root))
-
-    return (capacity, all_locs)
\ No newline at end of file
+    for node_id, coords, is_depot in nodes:
+        if not is_depot:
+            if node_id not in demands:
+                raise ValueError(f"No request for node {node_id+1} in {location_data_path}")
+            all_locs.append(Location(node_id, coords, demands[node_id], False))
+    all_locs.append(next(Location(node_id, coords, 0, True) for node_id, coords, is_depot in nodes if is_depot))
+
+    return (capacity, all_locs)
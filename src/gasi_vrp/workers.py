@@ -0,0 +1,54 @@
+import os
+import random
+from contextlib import contextmanager, nullcontext
+from multiprocessing import Pool
+from typing import Callable, Iterable, Iterator, Optional
+
+from vrp import VRP
+
+def run_processes(processes: Optional[int], ga_params: dict) -> int:
+    """ returns the number of worker processes for independent runs of ga_social_interaction_vrp with the keyword
+    arguments ga_params (all CPUs unless processes is given); runs with islands or evaluation workers need their
+    own worker processes, so they are run one after the other in this process"""
+    if ga_params.get('islands', 1) > 1 or ga_params.get('eval_workers', 0) > 0:
+        return 1
+    return processes or os.cpu_count()
+
+def _run_seeded(task):
+    fn, seed, args = task
+    # forked workers inherit the random state of the parent, so every task is seeded by the parent
+    random.seed(seed)
+    return fn(args)
+
+def _run_here(tasks) -> Iterator:
+    for task in tasks:
+        # the tasks reseed the random module, the random state of this process must not depend on them
+        state = random.getstate()
+        result = _run_seeded(task)
+        random.setstate(state)
+        yield result
+
+@contextmanager
+def worker_pool(processes: int, initializer: Optional[Callable] = None, initargs: tuple = (), vrp: Optional[VRP] = None):
+    """ yields run(fn, tasks, ordered=True), which returns an iterator over fn(task) for every task, computed by
+    a pool of processes workers set up by initializer(*initargs), or in this process if processes is 1 or less;
+    without ordered the results come as soon as they are done
+
+    every task is run with the random module seeded by a seed drawn from this process when run is called, so the
+    results do not depend on the number of workers; vrp is shared with the workers (see VRP.shared)
+
+    the modules whose functions run as tasks keep the state of a worker process (e.g. the instance and the GA
+    parameters) in module globals, set once by initializer"""
+    def seeded(fn, tasks):
+        return [(fn, random.getrandbits(64), task) for task in tasks]
+
+    if processes <= 1:
+        if initializer is not None:
+            initializer(*initargs)
+        yield lambda fn, tasks, ordered=True: _run_here(seeded(fn, tasks))
+        return
+
+    with vrp.shared() if vrp is not None else nullcontext(), Pool(processes, initializer=initializer, initargs=initargs) as pool:
+        def run(fn: Callable, tasks: Iterable, ordered=True) -> Iterator:
+            return (pool.imap if ordered else pool.imap_unordered)(_run_seeded, seeded(fn, tasks))
+        yield run
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# the modules of gasi_vrp import each other by their flat names, as when gasi_vrp.py is run as a script,
+# so the experiments put their directory on the path and import them the same way
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'gasi_vrp'))
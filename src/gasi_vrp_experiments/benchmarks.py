@@ -0,0 +1,207 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import time
+import zlib
+from datetime import datetime, timezone
+from statistics import median
+
+import numpy as np
+
+from game import GameFactory
+from gasi_vrp import ga_social_interaction_vrp, ox_operator, random_population
+from profiler import Profiler
+from vrp import VRP, DENSE
+from vrp_data_reader import read_file
+from gasi_vrp_experiments.gasi_vrp_experiments import TEST_SET_1, gap_percentage, instance_name
+
+""" Benchmark suite
+
++ micro: time of the hot functions on one instance, the median over repeat rounds of the mean time of a call
++ macro: GA runs on the TEST_SET_1 instances, each in a fresh process so its peak RSS is its own,
+  reporting throughput, peak RSS, the final gap to the optimum and the gap-vs-time curve
+
+results are stored as JSON, the compare command flags benchmarks that got worse by more than a threshold
+
+    PYTHONPATH=src python -m gasi_vrp_experiments.benchmarks run -o results/benchmarks/before.json
+    PYTHONPATH=src python -m gasi_vrp_experiments.benchmarks compare results/benchmarks/before.json results/benchmarks/after.json
+"""
+
+BENCHMARKS_DIR = 'results/benchmarks/'
+MICRO_INSTANCE = "data/augerat-1995-set-a/A-n69-k09.xml"
+
+LOWER = 'lower'     # lower values are better
+HIGHER = 'higher'   # higher values are better
+
+def _result(value, unit, better=LOWER):
+    return {'value': value, 'unit': unit, 'better': better}
+
+def _time_call(fn, repeat, min_seconds=0.05):
+    """ returns the median over repeat rounds of the mean seconds of a call of fn, every round calls fn
+    as many times as needed to run for at least min_seconds"""
+    rounds = []
+    for _ in range(repeat):
+        calls = 0
+        started = time.perf_counter()
+        while True:
+            fn()
+            calls += 1
+            elapsed = time.perf_counter() - started
+            if elapsed >= min_seconds:
+                break
+        rounds.append(elapsed / calls)
+    return median(rounds)
+
+def micro_benchmarks(repeat=5, instance=MICRO_INSTANCE) -> dict:
+    random.seed(0)
+    vrp = VRP(*read_file(instance))
+    game = GameFactory.create_game('PrisonersDilemma')
+    population = random_population(vrp, game, 100, np.random.default_rng(0))
+    chromosome = population.main_chromosomes[0]
+    chromosome_list = chromosome.tolist()
+    other = population.main_chromosomes[1]
+    m = len(chromosome)
+
+    timings = {
+        'xml load': lambda: read_file(instance),
+        'distance matrix build': lambda: VRP._get_distance_matrix(vrp.coords, np.float64, DENSE),
+        'total_distance': lambda: vrp.total_distance(chromosome),
+        'total_distances x100': lambda: vrp.total_distances(population.main_chromosomes),
+        'decode_routes': lambda: list(vrp.decode_routes(chromosome_list)),
+        'ox_operator': lambda: ox_operator(chromosome, other, m//3, 2*m//3),
+    }
+    return {f'micro/{name}': _result(_time_call(fn, repeat) * 1e6, 'us') for name, fn in timings.items()}
+
+def _macro_run(task):
+    instance, best, params = task
+    random.seed(zlib.crc32(instance.encode()))
+    vrp = VRP(*read_file(instance))
+    game = GameFactory.create_game(params.pop('game'))
+
+    started = time.perf_counter()
+    curve = []
+    profiler = Profiler(interval=10, callback=lambda record: curve.append(
+        [round(time.perf_counter() - started, 4), round(gap_percentage(record['best cost'], best), 5)]))
+    cost, _, _, run = ga_social_interaction_vrp(vrp, game, profiler=profiler, **params)
+
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 if sys.platform != 'darwin' else 1024**2)
+    return {
+        'generations per second': run['generations'] / run['seconds'],
+        'evaluations per second': run['evaluations'] / run['seconds'],
+        'peak rss': peak_rss,
+        'gap': gap_percentage(cost, best),
+        'curve': curve
+    }
+
+def macro_benchmarks(params: dict, instances=TEST_SET_1):
+    """ returns the benchmarks and the gap-vs-time curves of GA runs on instances"""
+    # spawned (not forked) workers, used for one run each, so ru_maxrss only covers that run
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(1, maxtasksperchild=1) as pool:
+        runs = pool.map(_macro_run, [(pth, best, dict(params)) for pth, best in instances], chunksize=1)
+
+    benchmarks, curves = {}, {}
+    for (pth, _), run in zip(instances, runs):
+        name = instance_name(pth)
+        benchmarks[f'macro/{name}/generations per second'] = _result(run['generations per second'], 'gen/s', HIGHER)
+        benchmarks[f'macro/{name}/evaluations per second'] = _result(run['evaluations per second'], 'eval/s', HIGHER)
+        benchmarks[f'macro/{name}/peak rss'] = _result(run['peak rss'], 'MiB')
+        benchmarks[f'macro/{name}/gap'] = _result(run['gap'], 'ratio')
+        curves[name] = run['curve']
+    return benchmarks, curves
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(suite, output, repeat, params):
+    results = {
+        'commit': _git_commit(),
+        'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': f"{platform.machine()} {os.cpu_count()} cpus",
+        'params': params,
+        'benchmarks': {},
+        'curves': {}
+    }
+    if suite in ('micro', 'all'):
+        results['benchmarks'].update(micro_benchmarks(repeat))
+    if suite in ('macro', 'all'):
+        benchmarks, curves = macro_benchmarks(params)
+        results['benchmarks'].update(benchmarks)
+        results['curves'] = curves
+
+    for name, result in results['benchmarks'].items():
+        print(f"{name:<50} {result['value']:>14.3f} {result['unit']}")
+
+    output = output or os.path.join(BENCHMARKS_DIR, f"{results['commit'] or 'local'}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as outfile:
+        json.dump(results, outfile, indent=1)
+    print('Results: ', output)
+
+def compare(base_path, head_path, threshold) -> int:
+    """ prints the change of every benchmark in both results, returns the number of regressions,
+    benchmarks that got worse by more than threshold (relative)"""
+    with open(base_path) as infile:
+        base = json.load(infile)
+    with open(head_path) as infile:
+        head = json.load(infile)
+
+    print(f"base {base.get('commit')} ({base.get('date')}) -> head {head.get('commit')} ({head.get('date')})")
+    regressions = 0
+    for name, head_result in head['benchmarks'].items():
+        base_result = base['benchmarks'].get(name)
+        if base_result is None:
+            continue
+
+        base_value, head_value = base_result['value'], head_result['value']
+        change = (head_value - base_value) / abs(base_value) if base_value else 0.0
+        worse = change > threshold if head_result['better'] == LOWER else change < -threshold
+        regressions += worse
+        print(f"{name:<50} {base_value:>14.3f} {head_value:>14.3f} {change:>+8.1%} {'REGRESSION' if worse else ''}")
+
+    print(f"{regressions} regression(s) over {threshold:.0%}")
+    return regressions
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark the GASI implementation')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='Run the benchmarks and store the results')
+    run_parser.add_argument('--suite', choices=['micro', 'macro', 'all'], default='all')
+    run_parser.add_argument('-o', dest='output', type=str, default=None,
+        help=f'Results file (default: {BENCHMARKS_DIR}<commit>.json)')
+    run_parser.add_argument('--repeat', type=int, default=5, help='Rounds per micro-benchmark (default: %(default)s)')
+    run_parser.add_argument('-p', dest='population_size', type=int, default=200)
+    run_parser.add_argument('-n', dest='num_generations', type=int, default=500)
+
+    compare_parser = commands.add_parser('compare', help='Compare two results files and flag regressions')
+    compare_parser.add_argument('base', type=str)
+    compare_parser.add_argument('head', type=str)
+    compare_parser.add_argument('--threshold', type=float, default=0.1,
+        help='Relative change that counts as a regression (default: %(default)s)')
+
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    if args.command == 'run':
+        params = {'game': 'PrisonersDilemma', 'population_size': args.population_size, 'num_generations': args.num_generations
+            , 'mutation_rate': 0.8, 'crossover_rate': 0.6, 'wgt_solution': 1, 'wgt_social': 0}
+        run(args.suite, args.output, args.repeat, params)
+    else:
+        sys.exit(1 if compare(args.base, args.head, args.threshold) else 0)
+
+if __name__ == "__main__":
+    main()
@@ -2,15 +2,12 @@ import argparse
 import csv
 import json
 import os
-import matplotlib.pyplot as plt
 
 from itertools import product 
 from statistics import mean
 
-from gasi_vrp.game import *
-from gasi_vrp.gasi_vrp import ga_social_interaction_vrp
-from gasi_vrp.vrp import VRP
-from gasi_vrp.vrp_data_reader import read_file
+from game import *
+from gasi_vrp_experiments.grid_runner import Job, run_grid, run_costs
 
 """ Data sources
 + Networks obtained from CRVLIB http://vrp.galgos.inf.puc-rio.br/index.php/en/
@@ -49,31 +46,34 @@ def gameClassFactory(code):
     else:
         return Game()
 
-def basic_params_exp(f_path):
+RUNS_DIR = 'results/runs/'
+
+def instance_jobs(experiment, params, runs, instances=TEST_SET_1):
+    """ returns the jobs of an experiment by instance, one job per run"""
+    return [[Job(experiment, pth, run, params) for run in range(runs)] for pth, best in instances]
+
+def basic_params_exp(f_path, processes=None):
     runs = 10
     data = {}
 
     pop_size = 500
     num_gens = 2000
+
+    grid = {}
+    for mr, cr in product([0.2, 0.4, 0.6, 0.8], [0.2, 0.4, 0.6, 0.8]):
+        grid[mr, cr] = instance_jobs('basic_params', dict(game='None', population_size=pop_size, num_generations=num_gens
+            , mutation_rate=mr, crossover_rate=cr, wgt_solution=1, wgt_social=0), runs)
+    results = run_grid([job for jobs in grid.values() for run_jobs in jobs for job in run_jobs]
+        , RUNS_DIR + 'basic_params_exp.jsonl', processes)
     
     all_data = []
     header = ['mutation rate', 'crossover rate'] + list(map(lambda x: "% Gap in "  + instance_name(x[0]), TEST_SET_1)) + ['Avg % Gap']
     all_data.append(header)
     print(header)
-    for mr, cr in product([0.2, 0.4, 0.6, 0.8], [0.2, 0.4, 0.6, 0.8]):
-        print(f'\n\n mutation rate = {mr}; crossover rate = {cr}')
+    for (mr, cr), jobs in grid.items():
         row = [mr, cr]
-        for pth, best in TEST_SET_1:
-            print('>> Instance', instance_name(pth))
-            instance_results = []
-            for run in range(runs):
-                print(f'>> Run{run+1}/{runs}')
-                vrp = VRP(*read_file(os.path.abspath(pth)))
-                game = Game()
-                result, routes, strategy_dist = ga_social_interaction_vrp(vrp, game, pop_size, num_gens
-                    , mutation_rate=mr, crossover_rate=cr, wgt_solution=1, wgt_social=0)
-                instance_results.append(result)
-            row.append(gap_percentage(mean(instance_results), best))
+        for (pth, best), run_jobs in zip(TEST_SET_1, jobs):
+            row.append(gap_percentage(mean(run_costs(results, run_jobs)), best))
         row.append(mean(row[2:]))
         print(row)
         all_data.append(row)
@@ -81,31 +81,58 @@ def basic_params_exp(f_path):
         writer = csv.writer(file)
         writer.writerows(all_data)
 
-def games_exp(f_path, mutation_rate, crossover_rate):
+def adaptive_params_exp(f_path, processes=None):
+    """ basic_params_exp with adaptive mutation operators: only the crossover rate is a grid, the mutation
+    operators are tuned during every run"""
+    runs = 10
+
+    pop_size = 500
+    num_gens = 2000
+
+    grid = {}
+    for cr in [0.2, 0.4, 0.6, 0.8]:
+        grid[cr] = instance_jobs('adaptive_params', dict(game='None', population_size=pop_size, num_generations=num_gens
+            , mutation_rate=0.8, crossover_rate=cr, wgt_solution=1, wgt_social=0, adaptive=True), runs)
+    results = run_grid([job for jobs in grid.values() for run_jobs in jobs for job in run_jobs]
+        , RUNS_DIR + 'adaptive_params_exp.jsonl', processes)
+
+    all_data = []
+    header = ['crossover rate'] + list(map(lambda x: "% Gap in "  + instance_name(x[0]), TEST_SET_1)) + ['Avg % Gap']
+    all_data.append(header)
+    print(header)
+    for cr, jobs in grid.items():
+        row = [cr]
+        for (pth, best), run_jobs in zip(TEST_SET_1, jobs):
+            row.append(gap_percentage(mean(run_costs(results, run_jobs)), best))
+        row.append(mean(row[1:]))
+        print(row)
+        all_data.append(row)
+    with open('results/adaptive_params_exp.csv', 'w') as file:
+        writer = csv.writer(file)
+        writer.writerows(all_data)
+
+def games_exp(f_path, mutation_rate, crossover_rate, processes=None):
     runs = 10
     data = {}
 
     pop_size = 500
     num_gens = 2000
+
+    grid = {}
+    for gc in GAMES_CODES:
+        grid[gc] = instance_jobs('games', dict(game=gc, population_size=pop_size, num_generations=num_gens
+            , mutation_rate=mutation_rate, crossover_rate=crossover_rate, wgt_solution=0.9, wgt_social=0.1), runs)
+    results = run_grid([job for jobs in grid.values() for run_jobs in jobs for job in run_jobs]
+        , RUNS_DIR + 'games_exp.jsonl', processes)
     
     all_data = []
     header = ['game'] + list(map(lambda x: "% Gap in "  + instance_name(x[0]), TEST_SET_1)) + ['Avg % Gap']
     all_data.append(header)
     print(header)
-    for gc in GAMES_CODES:
-        print(f'\n\n Game code = {gc}')
+    for gc, jobs in grid.items():
         row = [gc]
-        for pth, best in TEST_SET_1:
-            print('>> Instance', instance_name(pth))
-            instance_results = []
-            for run in range(runs):
-                print(f'>> Run{run+1}/{runs}')
-                vrp = VRP(*read_file(os.path.abspath(pth)))
-                game = gameClassFactory(gc)
-                result, routes, strategy_dist = ga_social_interaction_vrp(vrp, game, pop_size, num_gens
-                    , mutation_rate=mutation_rate, crossover_rate=crossover_rate, wgt_solution=0.9, wgt_social=0.1)
-                instance_results.append(result)
-            row.append(gap_percentage(mean(instance_results), best))
+        for (pth, best), run_jobs in zip(TEST_SET_1, jobs):
+            row.append(gap_percentage(mean(run_costs(results, run_jobs)), best))
         row.append(mean(row[2:]))
         print(row)
         all_data.append(row)
@@ -113,33 +140,30 @@ def games_exp(f_path, mutation_rate, crossover_rate):
         writer = csv.writer(file)
         writer.writerows(all_data)
 
-def weights_exp(f_path, mutation_rate, crossover_rate, game_code):
+def weights_exp(f_path, mutation_rate, crossover_rate, game_code, processes=None):
     runs = 10
     data = {}
 
     pop_size = 500
     num_gens = 2000
+
+    grid = {}
+    for n in range(1, 12):
+        w_social = n * 0.05
+        w_solution =  1 - w_social
+        grid[w_solution, w_social] = instance_jobs('weights', dict(game=game_code, population_size=pop_size, num_generations=num_gens
+            , mutation_rate=mutation_rate, crossover_rate=crossover_rate, wgt_solution=w_solution, wgt_social=w_social), runs)
+    results = run_grid([job for jobs in grid.values() for run_jobs in jobs for job in run_jobs]
+        , RUNS_DIR + 'weights_exp.jsonl', processes)
     
     all_data = []
     header = ['solution fitness weight', 'social fitness weight'] + list(map(lambda x: "% Gap in "  + instance_name(x[0]), TEST_SET_1)) + ['Avg % Gap']
     all_data.append(header)
     print(header)
-    for n in range(1, 12):
-        w_social = n * 0.05
-        w_solution =  1 - w_social
-        print(f'\n\n solution wgt = {w_solution}; social wgt = {w_social}')
+    for (w_solution, w_social), jobs in grid.items():
         row = [w_solution, w_social]
-        for pth, best in TEST_SET_1:
-            print('>> Instance', instance_name(pth))
-            instance_results = []
-            for run in range(runs):
-                print(f'>> Run{run+1}/{runs}')
-                vrp = VRP(*read_file(os.path.abspath(pth)))
-                game = gameClassFactory(game_code)
-                result, routes, strategy_dist = ga_social_interaction_vrp(vrp, game, pop_size, num_gens
-                    , mutation_rate=mutation_rate, crossover_rate=crossover_rate, wgt_solution=w_solution, wgt_social=w_social)
-                instance_results.append(result)
-            row.append(gap_percentage(mean(instance_results), best))
+        for (pth, best), run_jobs in zip(TEST_SET_1, jobs):
+            row.append(gap_percentage(mean(run_costs(results, run_jobs)), best))
         row.append(mean(row[2:]))
         print(row)
         all_data.append(row)
@@ -147,49 +171,34 @@ def weights_exp(f_path, mutation_rate, crossover_rate, game_code):
         writer = csv.writer(file)
         writer.writerows(all_data)
 
-def comp_exp(f_path, mutation_rate, crossover_rate, game_code, w_social):
+def comp_exp(f_path, mutation_rate, crossover_rate, game_code, w_social, processes=None):
     runs = 10
     data = {}
 
     pop_size = 500
     num_gens = 2000
+
+    grid = {
+        'GASI': instance_jobs('comp', dict(game=game_code, population_size=pop_size, num_generations=num_gens
+            , mutation_rate=mutation_rate, crossover_rate=crossover_rate, wgt_solution=1-w_social, wgt_social=w_social), runs),
+        'GA': instance_jobs('comp', dict(game='None', population_size=pop_size, num_generations=num_gens
+            , mutation_rate=mutation_rate, crossover_rate=crossover_rate, wgt_solution=1, wgt_social=0), runs),
+    }
+    results = run_grid([job for jobs in grid.values() for run_jobs in jobs for job in run_jobs]
+        , RUNS_DIR + 'comp_exp.jsonl', processes)
     
     all_data = []
     header = ['Algorithm'] + list(map(lambda x: "% Gap in "  + instance_name(x[0]), TEST_SET_1)) + ['Avg % Gap']
     all_data.append(header)
     print(header)
 
-    row = ['GASI']
-    for pth, best in TEST_SET_1:
-        print('>> Instance', instance_name(pth))
-        instance_results = []
-        for run in range(runs):
-            print(f'>> Run{run+1}/{runs}')
-            vrp = VRP(*read_file(os.path.abspath(pth)))
-            game = gameClassFactory(game_code)
-            result, routes, strategy_dist = ga_social_interaction_vrp(vrp, game, pop_size, num_gens
-                , mutation_rate=mutation_rate, crossover_rate=crossover_rate, wgt_solution=1-w_social, wgt_social=w_social)
-            instance_results.append(result)
-        row.append(gap_percentage(mean(instance_results), best))
-    row.append(mean(row[2:]))
-    all_data.append(row)
-    print(row)
-
-    row = ['GA']
-    for pth, best in TEST_SET_1:
-        print('>> Instance', instance_name(pth))
-        instance_results = []
-        for run in range(runs):
-            print(f'>> Run{run+1}/{runs}')
-            vrp = VRP(*read_file(os.path.abspath(pth)))
-            game = gameClassFactory(game_code)
-            result, routes, strategy_dist = ga_social_interaction_vrp(vrp, Game(), pop_size, num_gens
-                , mutation_rate=mutation_rate, crossover_rate=crossover_rate, wgt_solution=1, wgt_social=0)
-            instance_results.append(result)
-        row.append(gap_percentage(mean(instance_results), best))
-    row.append(mean(row[2:]))
-    all_data.append(row)
-    print(row)
+    for algorithm, jobs in grid.items():
+        row = [algorithm]
+        for (pth, best), run_jobs in zip(TEST_SET_1, jobs):
+            row.append(gap_percentage(mean(run_costs(results, run_jobs)), best))
+        row.append(mean(row[2:]))
+        all_data.append(row)
+        print(row)
 
     with open('results/comp_exp.csv', 'w') as file:
         writer = csv.writer(file)
@@ -198,29 +207,33 @@ def comp_exp(f_path, mutation_rate, crossover_rate, game_code, w_social):
 def parse_args():
     parser = argparse.ArgumentParser(description='Run experiments on GASI implementation')
 
+    parser.add_argument('-j', dest='processes', type=int, default=None,
+        help='Number of worker processes running the experiment runs (default: number of CPUs)')
+
     return parser.parse_args()
 
 
-def dist_exp(f_path, mutation_rate, crossover_rate, w_social):
+def dist_exp(f_path, mutation_rate, crossover_rate, w_social, processes=None):
     runs = 5
     data = {}
 
     pop_size = 500
     num_gens = 2000
 
+    grid = {}
     for gc in GAMES_CODES:
-        print(f'\n\n Game code = {gc}')
+        grid[gc] = instance_jobs('dist', dict(game=gc, population_size=pop_size, num_generations=num_gens
+            , mutation_rate=mutation_rate, crossover_rate=crossover_rate, wgt_solution=1-w_social, wgt_social=w_social
+            , keep_strategies=True), runs, TEST_SET_1[:2])
+    results = run_grid([job for jobs in grid.values() for run_jobs in jobs for job in run_jobs]
+        , RUNS_DIR + 'dist_exp.jsonl', processes)
+
+    for gc, jobs in grid.items():
         allrows = []
-        for pth, best in TEST_SET_1[:2]:
+        for run_jobs in jobs:
             row = []
-            print('>> Instance', instance_name(pth))
-            for run in range(runs):
-                print(f'>> Run{run+1}/{runs}')
-                vrp = VRP(*read_file(os.path.abspath(pth)))
-                game = gameClassFactory(gc)
-                result, routes, strategy_dist = ga_social_interaction_vrp(vrp, game, pop_size, num_gens
-                    , mutation_rate=mutation_rate, crossover_rate=crossover_rate, wgt_solution=1-w_social, wgt_social=w_social)
-                row = row + strategy_dist
+            for job in run_jobs:
+                row = row + results[job.key()]['strategies']
             allrows.append(row)
         with open(f'results/dists/{gc}_dist_exp.csv', 'w') as file:
             writer = csv.writer(file)
@@ -228,6 +241,9 @@ def dist_exp(f_path, mutation_rate, crossover_rate, w_social):
 
 
 def plot_dist():
+    # matplotlib takes longer to import than most runs take, so it is only loaded for plotting
+    import matplotlib.pyplot as plt
+
     base = 'results/dists/'
     filespaths = list(map(lambda x: base + x ,os.listdir('results/dists')))
     n_bins = 25
@@ -254,14 +270,15 @@ def plot_dist():
 
 
 def main():
-    parser = argparse.ArgumentParser()    
+    args = parse_args()
     f_path = ""
 
-    # basic_params_exp(f_path)
-    # games_exp(f_path, mutation_rate=0.8, crossover_rate=0.6)
-    # weights_exp(f_path, mutation_rate=0.8, crossover_rate=0.6, game_code="PrisonersDilemma")
-    # comp_exp(f_path, mutation_rate=0.8, crossover_rate=0.6, game_code="PrisonersDilemma", w_social=0.25)
-    # dist_exp(f_path, mutation_rate=0.8, crossover_rate=0.6, w_social=0.25)
+    # basic_params_exp(f_path, processes=args.processes)
+    # adaptive_params_exp(f_path, processes=args.processes)
+    # games_exp(f_path, mutation_rate=0.8, crossover_rate=0.6, processes=args.processes)
+    # weights_exp(f_path, mutation_rate=0.8, crossover_rate=0.6, game_code="PrisonersDilemma", processes=args.processes)
+    # comp_exp(f_path, mutation_rate=0.8, crossover_rate=0.6, game_code="PrisonersDilemma", w_social=0.25, processes=args.processes)
+    # dist_exp(f_path, mutation_rate=0.8, crossover_rate=0.6, w_social=0.25, processes=args.processes)
     plot_dist()
 
 if __name__ == "__main__":
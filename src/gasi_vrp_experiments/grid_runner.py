@@ -0,0 +1,95 @@
+import json
+import os
+import random
+import zlib
+from functools import lru_cache
+from typing import NamedTuple, Dict, List
+
+from game import GameFactory
+from gasi_vrp import ga_social_interaction_vrp
+from vrp import VRP, load_instance
+from workers import run_processes, worker_pool
+
+# compiled instances shared by all workers (and later experiments) through the OS page cache
+INSTANCE_CACHE_DIR = 'results/instances/'
+
+class Job(NamedTuple):
+    """ a single GA run of an experiment
+
+    params holds the keyword arguments of ga_social_interaction_vrp, plus the code of the game under 'game'
+    and, optionally, 'keep_strategies' to record the final strategy distribution of the run
+    """
+    experiment: str
+    instance: str
+    run: int
+    params: dict
+
+    def key(self) -> str:
+        return json.dumps([self.experiment, self.instance, self.run, self.params], sort_keys=True)
+
+@lru_cache(maxsize=None)
+def _load_vrp(instance: str) -> VRP:
+    # every worker loads an instance once and reuses it for all of its runs on that instance
+    return load_instance(os.path.abspath(instance), INSTANCE_CACHE_DIR)
+
+def _run_job(job: Job) -> dict:
+    key = job.key()
+
+    # seed from the job itself (rather than the seed of the pool) so a run gives the same result whichever
+    # worker runs it, and when it is rerun
+    random.seed(zlib.crc32(key.encode()))
+
+    params = dict(job.params)
+    game = GameFactory.create_game(params.pop('game'))
+    keep_strategies = params.pop('keep_strategies', False)
+    cost, routes, strategies, run = ga_social_interaction_vrp(_load_vrp(job.instance), game, **params)
+
+    record = {'key': key, 'experiment': job.experiment, 'instance': job.instance, 'run': job.run, 'params': job.params, 'cost': cost, **run}
+    if keep_strategies:
+        record['strategies'] = strategies
+    return record
+
+def load_results(store_path: str) -> Dict[str, dict]:
+    """ returns the finished runs in a results store by job key"""
+    results = {}
+    if not os.path.exists(store_path):
+        return results
+
+    with open(store_path) as store:
+        for line in store:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # a line cut short by a crash, its run is simply run again
+                continue
+            results[record['key']] = record
+    return results
+
+def run_grid(jobs: List[Job], store_path: str, processes=None) -> Dict[str, dict]:
+    """ runs the jobs that are not in the results store yet over a pool of processes workers, appending every run
+    to the store as soon as it finishes, and returns the records of all jobs by job key"""
+    results = load_results(store_path)
+    pending = [job for job in jobs if job.key() not in results]
+    print(f'>> {len(jobs) - len(pending)}/{len(jobs)} runs already in {store_path}')
+
+    if pending:
+        os.makedirs(os.path.dirname(store_path) or '.', exist_ok=True)
+        processes = min(min(run_processes(processes, job.params) for job in pending), len(pending))
+        with worker_pool(processes) as run, open(store_path, 'a+') as store:
+            # terminate a line cut short by a crash so the next record starts on a line of its own
+            if store.tell() > 0:
+                store.seek(store.tell() - 1)
+                if store.read(1) != '\n':
+                    store.write('\n')
+
+            for i, record in enumerate(run(_run_job, pending, ordered=False)):
+                store.write(json.dumps(record) + '\n')
+                store.flush()
+                os.fsync(store.fileno())
+                results[record['key']] = record
+                print(f">> Run {i+1}/{len(pending)}: {record['instance']} run {record['run']+1} = {record['cost']}")
+
+    return {job.key(): results[job.key()] for job in jobs}
+
+def run_costs(results: Dict[str, dict], jobs: List[Job]) -> List[float]:
+    return [results[job.key()]['cost'] for job in jobs]